@@ -0,0 +1,133 @@
+import asyncio
+
+import torch
+
+import metrics
+
+
+class MicroBatcher:
+    """
+    Groups the image tensors of concurrent requests into a single stacked
+    forward pass and hands each request back its own slice of the output.
+
+    `run_batch` is a coroutine function receiving one tensor per input
+    position (usually just the image batch), all sharing dim 0, and
+    returning a tuple of tensors whose rows line up with the inputs.
+    No forward pass exceeds `max_batch_size` rows. Up to `max_in_flight`
+    batches run at once; while they do, new requests queue up and form the
+    next batch.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0, max_in_flight=1):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self._queue = None
+        self._worker = None
+        self._carry = None
+        self._slots = None
+        self._in_flight = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, *tensors):
+        """
+        Queue one request's tensors and wait for its rows of the model output.
+        A request larger than max_batch_size is queued as chunks of at most
+        that size, whose outputs are joined back together.
+        """
+        if tensors[0].size(0) <= self.max_batch_size:
+            future = await self._enqueue(tensors)
+            return await future
+
+        chunks = zip(*(torch.split(tensor, self.max_batch_size) for tensor in tensors))
+        futures = [await self._enqueue(chunk) for chunk in chunks]
+        try:
+            results = [await future for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return tuple(torch.cat(parts) for parts in zip(*results))
+
+    async def _enqueue(self, tensors):
+        future = asyncio.get_running_loop().create_future()
+        metrics.QUEUE_DEPTH.inc(tensors[0].size(0))
+        await self._queue.put((tensors, future))
+        return future
+
+    async def _next_item(self):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        return await self._queue.get()
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        pending = [await self._next_item()]
+        size = pending[0][0][0].size(0)
+        deadline = loop.time() + self.max_wait
+
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            item_size = item[0][0].size(0)
+            if size + item_size > self.max_batch_size:
+                # keep the batch within bounds, the item opens the next one
+                self._carry = item
+                break
+            pending.append(item)
+            size += item_size
+
+        return pending
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            pending = await self._collect()
+            task = asyncio.create_task(self._dispatch(pending))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, pending):
+        try:
+            metrics.QUEUE_DEPTH.dec(sum(tensors[0].size(0) for tensors, _ in pending))
+            pending = [(tensors, future) for tensors, future in pending if not future.cancelled()]
+            if not pending:
+                return
+
+            sizes = [tensors[0].size(0) for tensors, _ in pending]
+            metrics.BATCH_SIZE.observe(sum(sizes))
+            try:
+                stacked = [torch.cat(parts) for parts in zip(*(tensors for tensors, _ in pending))]
+                outputs = await self.run_batch(*stacked)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            slices = [torch.split(output, sizes) for output in outputs]
+            for i, (_, future) in enumerate(pending):
+                if not future.done():
+                    future.set_result(tuple(output[i] for output in slices))
+        finally:
+            self._slots.release()
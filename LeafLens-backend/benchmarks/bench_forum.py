@@ -0,0 +1,136 @@
+"""
+Compare the old forum listing (every post, then one like COUNT per post) with
+the paginated single-query listing, on a freshly seeded SQLite database:
+
+    python -m benchmarks.bench_forum --posts 20000 --likes-per-post 5
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import forum
+import models
+from database import Base
+from benchmarks.common import time_ms, percentile
+
+
+PLANTS = ["tomato", "potato", "apple", "grape", "corn", "pepper", "strawberry", "peach", "cherry", "squash"]
+SYMPTOMS = ["spots", "blight", "mildew", "rust", "scab", "wilting", "yellowing", "mold", "rot", "curl"]
+FILLER = "the leaves started changing after a week of rain and I am not sure what to do next".split()
+
+
+def post_text(rng):
+    plant, symptom = rng.choice(PLANTS), rng.choice(SYMPTOMS)
+    words = rng.sample(FILLER, 8) + [symptom]
+    rng.shuffle(words)
+    return f"{plant.title()} with {symptom}?", " ".join(words)
+
+
+def seed(engine, posts, likes_per_post, users, replies_per_post=0):
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"user_id": u, "name": f"user{u}", "email": f"user{u}@example.com", "password_hash": "x", "user_type": "user"}
+            for u in range(1, users + 1)
+        ])
+        rows = []
+        for p in range(1, posts + 1):
+            title, content = post_text(rng)
+            rows.append({
+                "post_id": p,
+                "user_id": rng.randint(1, users),
+                "title": title,
+                "content": content,
+                "timestamp": start + timedelta(seconds=p * 37),
+            })
+        conn.execute(models.ForumPost.__table__.insert(), rows)
+        conn.execute(models.PostLike.__table__.insert(), [
+            {"post_id": p, "user_id": u}
+            for p in range(1, posts + 1)
+            for u in rng.sample(range(1, users + 1), rng.randint(0, 2 * likes_per_post))
+        ])
+        if replies_per_post:
+            conn.execute(models.ForumReply.__table__.insert(), [
+                {"post_id": p, "user_id": rng.randint(1, users), "content": post_text(rng)[1]}
+                for p in range(1, posts + 1)
+                for _ in range(rng.randint(0, 2 * replies_per_post))
+            ])
+
+
+def n_plus_one(db):
+    """The listing as it was before pagination."""
+    posts = db.query(models.ForumPost).all()
+    for post in posts:
+        post.like_count = db.query(models.PostLike).filter(models.PostLike.post_id == post.post_id).count()
+    return posts
+
+
+def walk_pages(db, limit):
+    cursor, total = None, 0
+    while True:
+        posts, cursor = forum.list_posts(db, limit=limit, cursor=cursor)
+        total += len(posts)
+        if cursor is None:
+            return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--likes-per-post", type=int, default=5)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "forum_bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    seed(engine, args.posts, args.likes_per_post, args.users)
+
+    statements = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    Session = sessionmaker(bind=engine)
+
+    def measure(fn):
+        nonlocal statements
+        db = Session()
+        try:
+            statements = 0
+            fn(db)
+            queries = statements
+            db.expunge_all()
+            timings = time_ms(lambda: (fn(db), db.expunge_all()), args.iters)
+        finally:
+            db.close()
+        return {"queries": queries, "p50_ms": percentile(timings, 50), "p95_ms": percentile(timings, 95)}
+
+    first, _ = forum.list_posts(Session(), limit=args.limit)
+    reference = {p.post_id: p.like_count for p in n_plus_one(Session())}
+    assert all(reference[p.post_id] == p.like_count for p in first), "like counts differ"
+
+    report = {
+        "posts": args.posts,
+        "likes": Session().query(models.PostLike).count(),
+        "n_plus_one_all_posts": measure(n_plus_one),
+        "first_page": measure(lambda db: forum.list_posts(db, limit=args.limit)),
+        "all_pages": measure(lambda db: walk_pages(db, args.limit)),
+    }
+    print(json.dumps(report, indent=2))
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare the ILIKE '%term%' forum filter with the FTS5 search index as the
+forum grows, on freshly seeded SQLite databases. A rare term is planted in
+--rare-posts posts of every size, so its matches stay constant while the
+forum grows; common terms like "tomato blight" match a fixed share instead:
+
+    python -m benchmarks.bench_forum_search --sizes 1000,10000,100000 --query "tomato blight"
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import forum
+import forum_search
+import migrate
+import models
+from benchmarks.bench_forum import seed
+from benchmarks.common import time_ms, percentile
+
+
+def ilike_search(db, terms, limit):
+    query = db.query(models.ForumPost)
+    for word in terms.split():
+        query = query.filter(
+            models.ForumPost.title.ilike(f"%{word}%") | models.ForumPost.content.ilike(f"%{word}%")
+        )
+    return query.order_by(models.ForumPost.timestamp.desc()).limit(limit).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--query", default="sclerotinia")
+    parser.add_argument("--rare-posts", type=int, default=25)
+    parser.add_argument("--replies-per-post", type=int, default=2)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--iters", type=int, default=20)
+    args = parser.parse_args()
+
+    report = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        path = os.path.join(tempfile.mkdtemp(), "forum_search_bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        migrate.upgrade(engine)
+        seed(engine, size, likes_per_post=2, users=200, replies_per_post=args.replies_per_post)
+        with engine.begin() as conn:
+            # goes through the sync triggers like any other edit
+            conn.execute(text("UPDATE forum_posts SET content = content || ' sclerotinia' WHERE post_id % :step = 0"),
+                         {"step": max(1, size // args.rare_posts)})
+
+        db = sessionmaker(bind=engine)()
+        timings = {
+            "ilike": time_ms(lambda: (ilike_search(db, args.query, args.limit), db.expunge_all()), args.iters),
+            "fts_posts": time_ms(lambda: (forum.search_posts(
+                db, args.query, limit=args.limit, include_replies=False), db.expunge_all()), args.iters),
+            "fts_posts_and_replies": time_ms(lambda: (forum.search_posts(
+                db, args.query, limit=args.limit), db.expunge_all()), args.iters),
+            "fts_filtered_listing": time_ms(lambda: (forum.list_posts(
+                db, disease=args.query, limit=args.limit), db.expunge_all()), args.iters),
+        }
+        report.append({
+            "posts": size,
+            "matches": len(forum_search.ranked_post_ids(db, args.query, size)),
+            **{f"{name}_p50_ms": percentile(t, 50) for name, t in timings.items()},
+        })
+        db.close()
+        engine.dispose()
+        os.remove(path)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Parity check and benchmark for the shared-input and fused-backbone inference paths.
+
+Compares three ways of running both classifiers on a batch:
+  two_pass      - the original path: every image transformed twice, two full models
+  shared_input  - one decode/transform per image, the tensor fed to both models
+  fused         - one decode/transform, one backbone, two classifier heads
+
+Run from LeafLens-backend/ (needs both checkpoints):
+    python -m benchmarks.bench_fused --batch-size 8 --iters 20
+"""
+import argparse
+import gc
+import json
+
+import torch
+
+import inference
+from benchmarks.common import current_rss_mb, peak_rss_mb, run_child, time_ms, percentile
+from benchmarks.synthetic import synthetic_batch
+
+
+def two_pass(images):
+    species_batch = inference.preprocess(images)
+    disease_batch = inference.preprocess(images)
+    with torch.no_grad():
+        return inference.species_model(species_batch), inference.disease_model(disease_batch)
+
+
+def shared_input(images):
+    batch = inference.preprocess(images)
+    with torch.no_grad():
+        return inference.species_model(batch), inference.disease_model(batch)
+
+
+def make_fused():
+    fused = inference.FusedClassifier(inference.species_model, inference.disease_model).eval()
+    inference.disease_model.features = inference.species_model.features
+
+    def fused_pass(images):
+        batch = inference.preprocess(images)
+        with torch.no_grad():
+            return fused(batch)
+    return fused_pass
+
+
+def parity(images):
+    reference = two_pass(images)
+    shared = shared_input(images)
+    matches = inference.backbones_match(inference.species_model, inference.disease_model)
+    fused = make_fused()(images)
+    return {
+        "shared_input_max_abs_diff": max((a - b).abs().max().item() for a, b in zip(reference, shared)),
+        "backbones_match": matches,
+        # with different backbones the fused disease head sees the species features,
+        # so its outputs are only expected to match when backbones_match is true
+        "fused_max_abs_diff": max((a - b).abs().max().item() for a, b in zip(reference, fused)),
+    }
+
+
+def run_mode(mode, batch_size, iters):
+    inference.load_models()
+    images = synthetic_batch(batch_size)
+    fn = make_fused() if mode == "fused" else globals()[mode]
+    gc.collect()
+
+    timings = time_ms(lambda: fn(images), iters)
+    return {
+        "mode": mode,
+        "batch_size": batch_size,
+        "p50_ms": percentile(timings, 50),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--mode", choices=["parity", "two_pass", "shared_input", "fused"])
+    args = parser.parse_args()
+
+    if args.mode == "parity":
+        inference.load_models()
+        print(json.dumps(parity(synthetic_batch(4))))
+        return
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.batch_size, args.iters)))
+        return
+
+    # parity and every mode run in their own process, so no peak RSS is
+    # inherited from a process that already loaded the models
+    report = {"parity": run_child("benchmarks.bench_fused", "--mode", "parity"), "results": []}
+    for mode in ("two_pass", "shared_input", "fused"):
+        report["results"].append(run_child(
+            "benchmarks.bench_fused", "--mode", mode, "--batch-size", str(args.batch_size), "--iters", str(args.iters),
+        ))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
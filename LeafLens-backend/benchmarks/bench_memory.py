@@ -0,0 +1,94 @@
+"""
+Per-worker memory of N inference workers with each weight-loading mode.
+
+  copy/spawn    - every worker reads both checkpoints into private memory (uvicorn --workers)
+  mmap/spawn    - every worker memory-maps them, the pages are shared in the page cache
+  copy/preload  - loaded once, then the workers are forked (gunicorn --preload)
+  mmap/preload  - both
+
+Each worker loads the models, runs one forward pass and reports its RSS and
+PSS while all workers are alive. PSS splits shared pages between the
+processes sharing them, so its sum is what the machine actually spends.
+Run from LeafLens-backend/ (needs both checkpoints):
+
+    python -m benchmarks.bench_memory --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+
+SCENARIOS = ["copy/spawn", "mmap/spawn", "copy/preload", "mmap/preload"]
+
+
+def worker(preloaded, reports, done):
+    import torch
+
+    import inference
+    from startup import process_memory
+
+    if not preloaded:
+        inference.load_runtime()
+    inference.run_models(torch.zeros((1, 3, 224, 224)))
+    reports.put(process_memory())
+    done.wait()
+
+
+def run_scenario(scenario, workers):
+    weights, start = scenario.split("/")
+    os.environ["LEAFLENS_WEIGHTS_MMAP"] = "1" if weights == "mmap" else "0"
+
+    preloaded = start == "preload"
+    if preloaded:
+        import torch
+
+        import inference
+
+        torch.set_num_threads(1)    # no OpenMP pool before the fork
+        inference.load_runtime()
+
+    context = multiprocessing.get_context("fork" if preloaded else "spawn")
+    reports, done = context.Queue(), context.Event()
+    processes = [context.Process(target=worker, args=(preloaded, reports, done)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    usage = [reports.get() for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+
+    return {
+        "scenario": scenario,
+        "workers": workers,
+        "rss_mb_per_worker": round(sum(u["rss_mb"] for u in usage) / workers, 1),
+        "rss_anon_mb_per_worker": round(sum(u["rss_anon_mb"] for u in usage) / workers, 1),
+        "pss_mb_per_worker": round(sum(u["pss_mb"] for u in usage) / workers, 1),
+        "pss_mb_total": round(sum(u["pss_mb"] for u in usage), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--scenario", choices=SCENARIOS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.workers)))
+        return
+
+    # every scenario runs in its own process, so nothing is inherited from a previous one
+    results = []
+    for scenario in SCENARIOS:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_memory", "--scenario", scenario, "--workers", str(args.workers)],
+            check=True, capture_output=True, text=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
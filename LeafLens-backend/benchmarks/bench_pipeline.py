@@ -0,0 +1,323 @@
+"""
+End-to-end benchmark of the prediction pipeline over a matrix of batch
+sizes, image resolutions, torch thread counts and client concurrency.
+
+  inprocess  - preprocess, both models and the disease filtering, called
+               directly; every (threads, resolution, batch size) cell runs in
+               its own process so peak RSS and thread pools start clean
+  http       - POST /predict_species_and_disease_batch against a local
+               uvicorn server (one per thread count, fresh database, prediction
+               cache off) from a closed-loop load generator with `concurrency`
+               clients, each sending its next request when the previous returns
+
+Images are synthetic JPEGs from fixed seeds, so the same profile produces the
+same load on every run and commit. Results (throughput, p50/p95/p99 latency,
+peak RSS) are written as JSON; compare two runs with benchmarks.compare.
+Run from LeafLens-backend/ (needs both checkpoints):
+
+    python -m benchmarks.bench_pipeline --profile quick --out bench.json
+    python -m benchmarks.bench_pipeline --mode http --concurrency 1,8 --batch-sizes 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import peak_rss_mb, percentile
+from benchmarks.synthetic import synthetic_batch
+
+# default matrices; any flag given on the command line overrides its axis
+PROFILES = {
+    "quick": {
+        "batch_sizes": "1,8", "resolutions": "1024x768", "threads": "1",
+        "concurrency": "1,4", "iters": 10, "requests": 24,
+    },
+    "full": {
+        "batch_sizes": "1,8,32", "resolutions": "640x480,1024x768,4000x3000", "threads": "1,2,4",
+        "concurrency": "1,4,16", "iters": 30, "requests": 96,
+    },
+}
+
+
+def parse_list(value, cast=int):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def parse_resolution(value):
+    w, h = (int(v) for v in value.split("x"))
+    return w, h
+
+
+def latency_summary(timings_ms):
+    timings_ms = sorted(timings_ms)
+    return {
+        "p50_ms": percentile(timings_ms, 50),
+        "p95_ms": percentile(timings_ms, 95),
+        "p99_ms": percentile(timings_ms, 99),
+        "mean_ms": round(sum(timings_ms) / len(timings_ms), 2) if timings_ms else None,
+    }
+
+
+def run_inprocess_cell(threads, resolution, batch_size, iters, seed):
+    import torch
+
+    torch.set_num_threads(threads)
+    import inference
+    from label_registry import LabelRegistry
+
+    inference.load_runtime()
+    labels = LabelRegistry.load()
+    images = synthetic_batch(batch_size, size=parse_resolution(resolution), seed=seed)
+
+    def once():
+        start = time.perf_counter()
+        batch = inference.preprocess(images)
+        decoded = time.perf_counter()
+        species_probs, disease_probs = inference.run_models(batch)
+        forwarded = time.perf_counter()
+        labels.predict(species_probs, disease_probs, 1, 4)
+        done = time.perf_counter()
+        return {"preprocess": decoded - start, "forward": forwarded - decoded, "filter": done - forwarded,
+                "total": done - start}
+
+    once()
+    runs = [once() for _ in range(iters)]
+    total_seconds = sum(run["total"] for run in runs)
+    return {
+        "kind": "inprocess",
+        "threads": threads,
+        "resolution": resolution,
+        "batch_size": batch_size,
+        "iters": iters,
+        "images_per_s": round(batch_size * iters / total_seconds, 2),
+        **latency_summary([run["total"] * 1000 for run in runs]),
+        "stage_p50_ms": {
+            stage: percentile(sorted(run[stage] * 1000 for run in runs), 50)
+            for stage in ("preprocess", "forward", "filter")
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def inprocess(args):
+    results = []
+    for threads in parse_list(args.threads):
+        for resolution in parse_list(args.resolutions, str):
+            for batch_size in parse_list(args.batch_sizes):
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_pipeline", "--cell",
+                     "--threads", str(threads), "--resolutions", resolution, "--batch-sizes", str(batch_size),
+                     "--iters", str(args.iters), "--seed", str(args.seed)],
+                    check=True, capture_output=True, text=True,
+                )
+                results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+                print(json.dumps(results[-1]), file=sys.stderr)
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_peak_rss_mb(pid, reset=False):
+    """VmHWM of a local process; with reset, restart the peak from its current RSS."""
+    try:
+        if reset:
+            with open(f"/proc/{pid}/clear_refs", "w") as f:
+                f.write("5")
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+
+class LocalServer:
+    """uvicorn serving main:app on a free port, with its own database and upload directory."""
+
+    def __init__(self, threads, max_batch_size):
+        self.threads = threads
+        self.max_batch_size = max_batch_size
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.tmp = tempfile.TemporaryDirectory(prefix="leaflens-bench-")
+        self.process = None
+
+    def __enter__(self):
+        env = dict(
+            os.environ,
+            LEAFLENS_DATABASE_URL=f"sqlite:///{self.tmp.name}/bench.db",
+            LEAFLENS_UPLOAD_DIR=os.path.join(self.tmp.name, "uploads"),
+            LEAFLENS_TORCH_THREADS=str(self.threads),
+            LEAFLENS_MAX_BATCH_SIZE=str(self.max_batch_size),
+            LEAFLENS_PREDICTION_CACHE_SIZE="0",
+        )
+        env.pop("LEAFLENS_PREDICTION_CACHE_PATH", None)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port), "--log-level", "warning"],
+            env=env,
+        )
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(30)
+        self.tmp.cleanup()
+
+    async def wait_ready(self, client, timeout=300):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with {self.process.returncode}")
+            try:
+                if (await client.get(f"{self.url}/health/ready")).status_code == 200:
+                    return
+            except Exception:
+                pass
+            await asyncio.sleep(0.5)
+        raise TimeoutError("server did not become ready")
+
+
+async def load(client, url, user_id, payloads, concurrency):
+    """Send every payload once with `concurrency` closed-loop clients: (latencies in ms, errors, seconds)."""
+    queue = list(reversed(payloads))
+    latencies, errors = [], 0
+
+    async def client_loop():
+        nonlocal errors
+        while queue:
+            files = queue.pop()
+            start = time.perf_counter()
+            response = await client.post(
+                f"{url}/predict_species_and_disease_batch", data={"user_id": str(user_id)}, files=files,
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def http_for_threads(args, threads):
+    import httpx
+
+    resolutions = parse_list(args.resolutions, str)
+    batch_sizes = parse_list(args.batch_sizes)
+    results = []
+    async with httpx.AsyncClient(timeout=300) as client:
+        with LocalServer(threads, max(batch_sizes)) as server:
+            await server.wait_ready(client)
+            user = await client.post(f"{server.url}/users/", json={
+                "name": "bench", "email": "bench@example.com", "user_type": "farmer", "password_hash": "x",
+            })
+            user_id = user.json()["user_id"]
+
+            for resolution in resolutions:
+                for batch_size in batch_sizes:
+                    # the server's prediction cache is off, so every request can send the same images
+                    images = synthetic_batch(batch_size, parse_resolution(resolution), args.seed)
+                    payloads = [[("files", (f"{i}.jpg", image, "image/jpeg")) for i, image in enumerate(images)]
+                                ] * args.requests
+                    await load(client, server.url, user_id, payloads[:2], 1)    # warm-up
+                    for concurrency in parse_list(args.concurrency):
+                        server_peak_rss_mb(server.process.pid, reset=True)
+                        latencies, errors, seconds = await load(
+                            client, server.url, user_id, payloads, concurrency
+                        )
+                        results.append({
+                            "kind": "http",
+                            "threads": threads,
+                            "resolution": resolution,
+                            "batch_size": batch_size,
+                            "concurrency": concurrency,
+                            "requests": len(latencies),
+                            "errors": errors,
+                            "requests_per_s": round(len(latencies) / seconds, 2),
+                            "images_per_s": round(len(latencies) * batch_size / seconds, 2),
+                            **latency_summary(latencies),
+                            "peak_rss_mb": server_peak_rss_mb(server.process.pid),
+                        })
+                        print(json.dumps(results[-1]), file=sys.stderr)
+    return results
+
+
+def http(args):
+    results = []
+    for threads in parse_list(args.threads):
+        results.extend(asyncio.run(http_for_threads(args, threads)))
+    return results
+
+
+def environment():
+    import torch
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["inprocess", "http", "all"], default="all")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--batch-sizes")
+    parser.add_argument("--resolutions")
+    parser.add_argument("--threads")
+    parser.add_argument("--concurrency")
+    parser.add_argument("--iters", type=int)
+    parser.add_argument("--requests", type=int, help="requests per http cell")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--cell", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    for name, default in PROFILES[args.profile].items():
+        if getattr(args, name) is None:
+            setattr(args, name, default)
+
+    if args.cell:
+        print(json.dumps(run_inprocess_cell(
+            int(args.threads), args.resolutions, int(args.batch_sizes), args.iters, args.seed,
+        )))
+        return
+
+    report = {
+        "environment": environment(),
+        "profile": {name: getattr(args, name) for name in (*PROFILES[args.profile], "seed")},
+        "results": [],
+    }
+    if args.mode in ("inprocess", "all"):
+        report["results"].extend(inprocess(args))
+    if args.mode in ("http", "all"):
+        report["results"].extend(http(args))
+
+    body = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare the torchvision reference preprocessing with the fast decode path.
+
+Reports per-stage timings of the fast path, end-to-end latency of both, and
+how close their outputs are, on synthetic phone-sized JPEGs:
+
+    python -m benchmarks.bench_preprocessing --resolutions 1024x768,4000x3000,8000x6000
+"""
+import argparse
+import io
+import json
+
+import torch
+from PIL import Image
+
+import preprocessing
+from inference import reference_transform
+from benchmarks.common import time_ms, percentile
+from benchmarks.synthetic import synthetic_batch
+
+
+def reference(images):
+    return torch.stack([reference_transform()(Image.open(io.BytesIO(b)).convert("RGB")) for b in images])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolutions", default="1024x768,4000x3000")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--iters", type=int, default=10)
+    args = parser.parse_args()
+
+    report = []
+    for resolution in args.resolutions.split(","):
+        w, h = (int(v) for v in resolution.split("x"))
+        images = synthetic_batch(args.batch_size, size=(w, h))
+
+        ref_timings = time_ms(lambda: reference(images), args.iters)
+        fast_timings = time_ms(lambda: preprocessing.preprocess_batch(images), args.iters)
+
+        stages = {}
+        preprocessing.preprocess_batch(images, timings=stages)
+        diff = (reference(images) - preprocessing.preprocess_batch(images)).abs()
+
+        report.append({
+            "resolution": resolution,
+            "batch_size": args.batch_size,
+            "reference_p50_ms": percentile(ref_timings, 50),
+            "fast_p50_ms": percentile(fast_timings, 50),
+            "fast_stage_ms": {stage: round(ms, 2) for stage, ms in stages.items()},
+            "max_abs_diff": round(diff.max().item(), 4),
+            "mean_abs_diff": round(diff.mean().item(), 4),
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
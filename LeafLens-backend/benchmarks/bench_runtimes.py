@@ -0,0 +1,90 @@
+"""
+Compare the eager, TorchScript and ONNX Runtime inference backends.
+
+Reports output parity against eager plus forward latency and RSS per backend,
+the parity check and each backend in its own process. Export the artifacts first:
+
+    python export_models.py
+    python -m benchmarks.bench_runtimes --batch-sizes 1,8,32 --iters 20
+"""
+import argparse
+import json
+import os
+
+import torch
+
+import inference
+from config import EXPORT_DIR
+from runtime import RUNTIMES, Classifiers, EagerRuntime, TorchScriptRuntime, OnnxRuntime
+from benchmarks.common import current_rss_mb, peak_rss_mb, run_child, time_ms, percentile
+from benchmarks.synthetic import synthetic_batch
+
+
+def parity(export_dir):
+    inference.load_models()
+    batch = inference.preprocess(synthetic_batch(4))
+    backends = {
+        "eager": EagerRuntime(Classifiers(inference.species_model, inference.disease_model,
+                                          inference.fused_model), inference.device),
+        "torchscript": TorchScriptRuntime(export_dir, inference.device),
+        "onnx": OnnxRuntime(export_dir),
+    }
+    with torch.no_grad():
+        reference = backends["eager"](batch)
+        report = {}
+        for name, backend in backends.items():
+            outputs = backend(batch)
+            report[name] = max((a - b).abs().max().item() for a, b in zip(reference, outputs))
+    return report
+
+
+def measure(batch_sizes, iters):
+    inference.load_runtime()
+    result = {"runtime": inference.runtime.name, "threads": torch.get_num_threads()}
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            batch = inference.preprocess(synthetic_batch(batch_size))
+            timings = time_ms(lambda: inference.forward(batch), iters)
+            result[f"bs{batch_size}_p50_ms"] = percentile(timings, 50)
+            result[f"bs{batch_size}_p95_ms"] = percentile(timings, 95)
+            result[f"bs{batch_size}_images_per_s"] = round(batch_size * 1000 / percentile(timings, 50), 1)
+    result["rss_mb"] = current_rss_mb()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runtimes", default=",".join(RUNTIMES))
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--parity", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    if args.measure:
+        print(json.dumps(measure(batch_sizes, args.iters)))
+        return
+    if args.parity:
+        print(json.dumps(parity(args.export_dir)))
+        return
+
+    # no model is loaded in this process, the children's peak RSS is their own
+    report = {
+        "max_abs_diff_vs_eager": run_child("benchmarks.bench_runtimes", "--parity", "--export-dir", args.export_dir),
+        "performance": [],
+    }
+    for name in args.runtimes.split(","):
+        env = dict(os.environ, LEAFLENS_RUNTIME=name, LEAFLENS_EXPORT_DIR=args.export_dir)
+        report["performance"].append(run_child(
+            "benchmarks.bench_runtimes", "--measure", "--batch-sizes", args.batch_sizes, "--iters", str(args.iters),
+            env=env,
+        ))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
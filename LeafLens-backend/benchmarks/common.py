@@ -0,0 +1,58 @@
+import json
+import resource
+import subprocess
+import sys
+import time
+
+# where benchmarks.seed and benchmarks.load_api keep their database by default
+LOAD_TEST_DATABASE_URL = "sqlite:///./leaflens_load.db"
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_child(module, *args, env=None):
+    """
+    Run `python -m module *args` and return the JSON printed on its last line.
+    ru_maxrss is inherited across fork and exec, so anything measuring peak RSS
+    runs in a child started before its parent has loaded a model.
+    """
+    out = subprocess.run(
+        [sys.executable, "-m", module, *args], check=True, capture_output=True, text=True, env=env,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def time_ms(fn, iters, warmup=1):
+    """Run `fn` `iters` times after `warmup` calls and return the sorted timings in ms."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[idx], 2)
+
+
+def skewed(rng, n):
+    """An id in 1..n, low ids far more likely: the top 1% of ids get about 10% of the picks."""
+    return int(n * rng.random() ** 2) + 1
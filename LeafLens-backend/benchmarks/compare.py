@@ -0,0 +1,123 @@
+"""
+Compare two bench_pipeline reports and flag regressions: throughput down, or
+latency or peak RSS up, by more than --threshold percent. Exits with 1 if
+any matrix cell regressed, so it can gate a CI job.
+
+    python -m benchmarks.compare base.json head.json --threshold 10
+
+With --commits, benchmark both commits first. Each is checked out in a
+temporary git worktree and measured with this tree's harness (the checkpoints
+are linked in), so both sides run exactly the same load; arguments after --
+go to bench_pipeline:
+
+    python -m benchmarks.compare --commits main HEAD -- --profile quick --mode inprocess
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+KEY = ("kind", "threads", "resolution", "batch_size", "concurrency")
+HIGHER_IS_BETTER = ("images_per_s",)
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+
+
+def cell_key(result):
+    return tuple(result.get(name) for name in KEY)
+
+
+def compare(base, head, threshold):
+    """One row per matrix cell in both reports: (key, {metric: (base, head, change %)}, regressed metrics)."""
+    base_cells = {cell_key(r): r for r in base["results"]}
+    rows = []
+    for result in head["results"]:
+        before = base_cells.get(cell_key(result))
+        if before is None:
+            continue
+        changes, regressed = {}, []
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            changes[metric] = (old, new, round(change, 1))
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressed.append(metric)
+        if result.get("errors"):
+            regressed.append("errors")
+        rows.append((cell_key(result), changes, regressed))
+    return rows
+
+
+def print_report(rows, threshold):
+    for key, changes, regressed in rows:
+        label = " ".join(f"{name}={value}" for name, value in zip(KEY, key) if value is not None)
+        print(f"{'REGRESSED' if regressed else 'ok':9} {label}")
+        for metric, (old, new, change) in changes.items():
+            flag = "  <--" if metric in regressed else ""
+            print(f"            {metric:13} {old:>10} -> {new:>10}  {change:+6.1f}%{flag}")
+    regressions = sum(1 for _, _, regressed in rows if regressed)
+    print(f"{regressions}/{len(rows)} cells regressed by more than {threshold}%")
+    return regressions
+
+
+def bench_commit(commit, bench_args, out_path):
+    """Run bench_pipeline on `commit` in a temporary worktree, with this tree's harness and checkpoints."""
+    from inference import SPECIES_CHECKPOINT, DISEASE_CHECKPOINT
+
+    prefix = subprocess.run(
+        ["git", "rev-parse", "--show-prefix"], check=True, capture_output=True, text=True,
+    ).stdout.strip()
+    with tempfile.TemporaryDirectory(prefix="leaflens-compare-") as tmp:
+        worktree = os.path.join(tmp, "tree")
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, commit], check=True, capture_output=True)
+        try:
+            backend = os.path.join(worktree, prefix)
+            shutil.copytree(
+                "benchmarks", os.path.join(backend, "benchmarks"),
+                dirs_exist_ok=True, ignore=shutil.ignore_patterns("__pycache__"),
+            )
+            for checkpoint in (SPECIES_CHECKPOINT, DISEASE_CHECKPOINT):
+                target = os.path.join(backend, checkpoint)
+                if not os.path.exists(target):
+                    os.symlink(os.path.abspath(checkpoint), target)
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_pipeline", *bench_args, "--out", os.path.abspath(out_path)],
+                check=True, cwd=backend,
+            )
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("reports", nargs="*", help="base.json head.json")
+    parser.add_argument("--commits", nargs=2, metavar=("BASE", "HEAD"))
+    parser.add_argument("--out-dir", default=".", help="where --commits writes base.json and head.json")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    argv, bench_args = sys.argv[1:], []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, bench_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    if args.commits:
+        paths = [os.path.join(args.out_dir, f"{side}.json") for side in ("base", "head")]
+        for commit, path in zip(args.commits, paths):
+            print(f"benchmarking {commit}", file=sys.stderr)
+            bench_commit(commit, bench_args, path)
+    elif len(args.reports) == 2:
+        paths = args.reports
+    else:
+        parser.error("give two reports, or --commits BASE HEAD")
+
+    base, head = (json.load(open(path)) for path in paths)
+    sys.exit(1 if print_report(compare(base, head, args.threshold), args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
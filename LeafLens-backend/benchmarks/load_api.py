@@ -0,0 +1,207 @@
+"""
+Load test of the CRUD and forum endpoints on a seeded database (see
+benchmarks.seed), with a budget per endpoint.
+
+A weighted mix of the busiest non-inference requests runs with `concurrency`
+clients against the app in this process, over ASGI, so a SQLAlchemy hook can
+count the queries each request runs. Every endpoint gets its request count,
+errors, p50/p95/p99 latency and queries per request in a JSON report. The
+run fails (exit 1) when an endpoint goes over its budget of queries per
+request or p95 latency, or answers with a 5xx.
+
+    python -m benchmarks.seed --scale 0.1
+    python -m benchmarks.load_api --requests 5000 --concurrency 16 --out load.json
+    python -m benchmarks.load_api --budgets budgets.json    # {"GET /scans/": {"p95_ms": 80}, ...}
+
+Requests change the database (likes are toggled), so reseed for comparable runs.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import time
+
+# nothing that imports database.py here, the app's database is chosen in main()
+from benchmarks.common import LOAD_TEST_DATABASE_URL, percentile, skewed
+
+# share of the traffic of each endpoint
+MIX = {
+    "GET /forum_posts/": 30,
+    "GET /forum_posts/{post_id}/replies": 20,
+    "POST /forum_posts/{post_id}/like": 10,
+    "GET /scans/": 25,
+    "GET /users/{user_id}/stats": 15,
+}
+
+# the most queries a request may run, and its p95 latency. Queries per request don't
+# depend on the machine; the latencies are for the default 8 clients on one core,
+# where most of a request's time is spent queued behind the others
+BUDGETS = {
+    "GET /forum_posts/": {"queries": 1, "p95_ms": 100},
+    "GET /forum_posts/{post_id}/replies": {"queries": 2, "p95_ms": 100},
+    "POST /forum_posts/{post_id}/like": {"queries": 6, "p95_ms": 150},
+    "GET /scans/": {"queries": 1, "p95_ms": 250},    # unpaginated, power users have thousands
+    "GET /users/{user_id}/stats": {"queries": 1, "p95_ms": 100},
+}
+
+# query counter of the request in flight; over ASGI the app runs in the client's
+# task, and the context follows it into the threadpool of sync endpoints
+current_queries = contextvars.ContextVar("current_queries", default=None)
+
+
+def on_execute(*_):
+    counter = current_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class Workload:
+    """The next request of the mix, with ids drawn the way the seeded traffic is skewed."""
+
+    def __init__(self, users, posts, seed):
+        self.users = users
+        self.posts = posts
+        self.rng = random.Random(seed)
+        self.routes = list(MIX)
+        self.weights = list(MIX.values())
+        self.next_cursor = None
+
+    def next(self):
+        """(route, method, url, json body or None)."""
+        route = self.rng.choices(self.routes, self.weights)[0]
+        if route == "GET /forum_posts/":
+            # about a third of listings follow a previous page's cursor
+            if self.next_cursor and self.rng.random() < 0.3:
+                return route, "GET", f"/forum_posts/?limit=20&cursor={self.next_cursor}", None
+            return route, "GET", "/forum_posts/?limit=20", None
+        if route == "GET /forum_posts/{post_id}/replies":
+            return route, "GET", f"/forum_posts/{skewed(self.rng, self.posts)}/replies", None
+        if route == "POST /forum_posts/{post_id}/like":
+            post_id = skewed(self.rng, self.posts)
+            return route, "POST", f"/forum_posts/{post_id}/like", {
+                "post_id": post_id, "user_id": self.rng.randint(1, self.users),
+            }
+        if route == "GET /scans/":
+            return route, "GET", f"/scans/?user_id={skewed(self.rng, self.users)}", None
+        return route, "GET", f"/users/{self.rng.randint(1, self.users)}/stats", None
+
+
+async def run(app, workload, requests, concurrency):
+    import httpx
+
+    samples = {route: [] for route in MIX}    # (latency ms, queries, status)
+    remaining = requests
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest") as client:
+        async def client_loop():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                route, method, url, body = workload.next()
+                queries = [0]
+                current_queries.set(queries)
+                start = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                elapsed = (time.perf_counter() - start) * 1000
+                samples[route].append((elapsed, queries[0], response.status_code))
+                if route == "GET /forum_posts/":
+                    workload.next_cursor = response.headers.get("x-next-cursor")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+    return samples, seconds
+
+
+def summarize(samples, seconds, budgets):
+    endpoints, violations = {}, []
+    for route, rows in samples.items():
+        if not rows:
+            continue
+        latencies = sorted(row[0] for row in rows)
+        queries = [row[1] for row in rows]
+        server_errors = sum(1 for row in rows if row[2] >= 500)
+        summary = {
+            "requests": len(rows),
+            "requests_per_s": round(len(rows) / seconds, 1),
+            "status": {str(code): sum(1 for row in rows if row[2] == code) for code in sorted({r[2] for r in rows})},
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "queries_mean": round(sum(queries) / len(queries), 2),
+            "queries_max": max(queries),
+            "budget": budgets.get(route),
+        }
+        endpoints[route] = summary
+
+        budget = budgets.get(route, {})
+        if "queries" in budget and summary["queries_max"] > budget["queries"]:
+            violations.append(f"{route}: {summary['queries_max']} queries per request, budget {budget['queries']}")
+        if "p95_ms" in budget and summary["p95_ms"] > budget["p95_ms"]:
+            violations.append(f"{route}: p95 {summary['p95_ms']} ms, budget {budget['p95_ms']} ms")
+        if server_errors:
+            violations.append(f"{route}: {server_errors} responses with a 5xx status")
+    return endpoints, violations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", default=LOAD_TEST_DATABASE_URL)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--budgets", help="JSON file of per-endpoint budgets, merged over the defaults")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    budgets = {route: dict(budget) for route, budget in BUDGETS.items()}
+    if args.budgets:
+        with open(args.budgets) as f:
+            for route, budget in json.load(f).items():
+                budgets.setdefault(route, {}).update(budget)
+
+    # the app reads its database from the environment when it's imported
+    os.environ["LEAFLENS_DATABASE_URL"] = args.database_url
+    from sqlalchemy import event, func, inspect
+
+    import main as api
+    import models
+    from database import SessionLocal, engine
+
+    users = posts = None
+    if inspect(engine).has_table(models.User.__tablename__):
+        with SessionLocal() as db:
+            users = db.query(func.max(models.User.user_id)).scalar()
+            posts = db.query(func.max(models.ForumPost.post_id)).scalar()
+    if not users or not posts:
+        sys.exit(f"{args.database_url} has no users or forum posts, run benchmarks.seed first")
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    samples, seconds = asyncio.run(run(api.app, Workload(users, posts, args.seed), args.requests, args.concurrency))
+    endpoints, violations = summarize(samples, seconds, budgets)
+
+    report = {
+        "database": {"users": users, "forum_posts": posts},
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seconds": round(seconds, 2),
+        "requests_per_s": round(args.requests / seconds, 1),
+        "endpoints": endpoints,
+        "violations": violations,
+    }
+    body = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+    for violation in violations:
+        print(f"over budget: {violation}", file=sys.stderr)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Accuracy, latency and memory of the quantized engines next to the fp32 baseline.
+
+With --root pointing at a PlantNet-300K style dataset (train/val/test folders),
+species top-1/top-5 accuracy is measured on the test split and the static
+engine is calibrated on the val split. The disease model has no labels in that
+dataset, so its column is top-1 agreement with the fp32 disease model.
+Without --root, accuracy is skipped and static calibration uses synthetic images.
+
+Run from LeafLens-backend/ (needs both checkpoints):
+    python -m benchmarks.quantization_report --root /data/plantnet_300K --eval-batches 50
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+
+# the report converts the fp32 models itself
+os.environ["LEAFLENS_ENGINE"] = "fp32"
+os.environ["LEAFLENS_FUSED_MODEL"] = "off"
+
+import torch
+
+import inference
+import quantization
+from utils import get_data, count_correct_topk
+from benchmarks.common import current_rss_mb, peak_rss_mb, run_child, time_ms, percentile
+from benchmarks.synthetic import synthetic_batch
+
+
+def calibration(root, n_batches):
+    if root:
+        return quantization.calibration_set(root, n_batches=n_batches)
+    return [inference.preprocess(synthetic_batch(8, seed=100 + i * 8)) for i in range(n_batches)]
+
+
+def build(engine, root, n_batches):
+    inference.load_models()
+    batches = calibration(root, n_batches) if engine == "static" else None
+    species = quantization.apply_engine(copy.deepcopy(inference.species_model), engine, batches)
+    disease = quantization.apply_engine(copy.deepcopy(inference.disease_model), engine, batches)
+    return species, disease
+
+
+def accuracy(models, root, eval_batches, batch_size):
+    _, _, testloader, _ = get_data(root, image_size=224, crop_size=224, batch_size=batch_size,
+                                   num_workers=0, pretrained=True)
+    totals = {engine: {"top1": 0, "top5": 0, "disease_agreement": 0} for engine in models}
+    n = 0
+    with torch.no_grad():
+        for i, (x, y) in enumerate(testloader):
+            if i >= eval_batches:
+                break
+            n += len(y)
+            reference = models["fp32"][1](x).argmax(dim=1)
+            for engine, (species, disease) in models.items():
+                scores = species(x)
+                totals[engine]["top1"] += count_correct_topk(scores, y, 1).item()
+                totals[engine]["top5"] += count_correct_topk(scores, y, 5).item()
+                totals[engine]["disease_agreement"] += count_correct_topk(disease(x), reference, 1).item()
+
+    report = {}
+    for engine, counts in totals.items():
+        report[engine] = {k: round(100 * v / n, 2) for k, v in counts.items()}
+        report[engine]["species_top1_delta"] = round(report[engine]["top1"] - report["fp32"]["top1"], 2) \
+            if "fp32" in report else 0.0
+    return report
+
+
+def measure(engine, root, n_batches, iters):
+    """Latency and RSS for one engine, run in its own process."""
+    species, disease = build(engine, root, n_batches)
+    inference.species_model = inference.disease_model = None
+    gc.collect()
+
+    result = {"engine": engine}
+    with torch.no_grad():
+        for batch_size in (1, 8):
+            x = inference.preprocess(synthetic_batch(batch_size))
+            timings = time_ms(lambda: (species(x), disease(x)), iters)
+            result[f"bs{batch_size}_p50_ms"] = percentile(timings, 50)
+            result[f"bs{batch_size}_p95_ms"] = percentile(timings, 95)
+    result["rss_mb"] = current_rss_mb()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", help="PlantNet-300K style dataset root")
+    parser.add_argument("--engines", default="fp32,dynamic,static")
+    parser.add_argument("--calibration-batches", type=int, default=10)
+    parser.add_argument("--eval-batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--measure", choices=quantization.ENGINES)
+    parser.add_argument("--accuracy", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    engines = args.engines.split(",")
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.root, args.calibration_batches, args.iters)))
+        return
+    if args.accuracy:
+        models = {engine: build(engine, args.root, args.calibration_batches) for engine in ["fp32"] + engines}
+        print(json.dumps(accuracy(models, args.root, args.eval_batches, args.batch_size)))
+        return
+
+    # the accuracy run and every engine's measurement each get their own process;
+    # this one never loads a model, so no child inherits its peak RSS
+    report = {"backend": quantization.select_backend(), "performance": []}
+    common = ["--calibration-batches", str(args.calibration_batches)] + (["--root", args.root] if args.root else [])
+    for engine in engines:
+        report["performance"].append(run_child(
+            "benchmarks.quantization_report", "--measure", engine, "--iters", str(args.iters), *common,
+        ))
+
+    if args.root:
+        report["accuracy"] = run_child(
+            "benchmarks.quantization_report", "--accuracy", "--engines", args.engines,
+            "--eval-batches", str(args.eval_batches), "--batch-size", str(args.batch_size), *common,
+        )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
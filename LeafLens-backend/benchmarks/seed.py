@@ -0,0 +1,153 @@
+"""
+Seed an empty database with production-like volumes for load tests:
+users, plants, diseases, scans, forum posts, replies and likes, plus the
+user_stats counters that match them. Activity is skewed the way real traffic
+is: a few users own many scans and posts, a few posts collect most replies
+and likes. Everything comes from one seed, so every run builds the same data.
+
+    python -m benchmarks.seed                                  # 100k users, 1M scans, 500k likes
+    python -m benchmarks.seed --scale 0.01                     # the same shape, 1% of the rows
+    python -m benchmarks.seed --database-url sqlite:///./leaflens.db
+
+The database is migrated to head first and must not have any users yet.
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+import migrate
+import models
+from database import create_db_engine, sqlite_pragmas
+from disease_classes import disease_classes
+from benchmarks.bench_forum import PLANTS, post_text
+from benchmarks.common import LOAD_TEST_DATABASE_URL, skewed
+
+VOLUMES = {"users": 100_000, "scans": 1_000_000, "posts": 50_000, "replies": 200_000, "likes": 500_000}
+USER_TYPES = ["farmer"] * 8 + ["gardener"] * 3 + ["admin"]
+CHUNK = 50_000
+START = datetime(2024, 1, 1)
+SPAN_SECONDS = 2 * 365 * 24 * 3600
+
+
+def insert_chunks(conn, table, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            conn.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        conn.execute(table.insert(), chunk)
+
+
+def seed(engine, volumes, seed=0):
+    """Insert `volumes` (table -> rows) and return the row counts written."""
+    rng = random.Random(seed)
+    users, posts = volumes["users"], volumes["posts"]
+    scans_per_user, posts_per_user, likes_per_author = Counter(), Counter(), Counter()
+
+    def user_rows():
+        for u in range(1, users + 1):
+            yield {"user_id": u, "name": f"user{u}", "email": f"user{u}@example.com",
+                   "password_hash": "x", "user_type": rng.choice(USER_TYPES)}
+
+    def scan_rows():
+        for s in range(1, volumes["scans"] + 1):
+            user_id = skewed(rng, users)
+            scans_per_user[user_id] += 1
+            yield {"scan_id": s, "user_id": user_id, "plant_id": rng.randint(1, len(PLANTS)),
+                   "disease_id": rng.randint(1, len(disease_classes)),
+                   "date": START + timedelta(seconds=rng.randrange(SPAN_SECONDS)),
+                   "confidence_score": round(rng.uniform(0.3, 1.0), 4)}
+
+    post_authors = {}
+
+    def post_rows():
+        for p in range(1, posts + 1):
+            user_id = post_authors[p] = skewed(rng, users)
+            posts_per_user[user_id] += 1
+            title, content = post_text(rng)
+            yield {"post_id": p, "user_id": user_id, "title": title, "content": content,
+                   "timestamp": START + timedelta(seconds=p * SPAN_SECONDS // posts)}
+
+    def reply_rows():
+        for _ in range(volumes["replies"]):
+            post_id = skewed(rng, posts)
+            yield {"post_id": post_id, "user_id": rng.randint(1, users), "content": post_text(rng)[1],
+                   "timestamp": START + timedelta(seconds=post_id * SPAN_SECONDS // posts + rng.randrange(86400))}
+
+    def like_rows():
+        # a user likes a post at most once
+        target = min(volumes["likes"], users * posts)
+        seen = set()
+        while len(seen) < target:
+            pair = (skewed(rng, posts), rng.randint(1, users))
+            if pair not in seen:
+                seen.add(pair)
+                likes_per_author[post_authors[pair[0]]] += 1
+                yield {"post_id": pair[0], "user_id": pair[1]}
+
+    with engine.begin() as conn:
+        if conn.execute(select(func.count()).select_from(models.User.__table__)).scalar():
+            raise SystemExit("the database already has users, seed an empty one")
+
+        for name, table, rows in (
+            ("users", models.User.__table__, user_rows()),
+            ("plants", models.Plant.__table__, (
+                {"plant_id": i, "name": plant, "common_name": plant.title(), "species": plant}
+                for i, plant in enumerate(PLANTS, 1)
+            )),
+            ("diseases", models.Disease.__table__, (
+                {"disease_id": i, "name": name} for i, name in enumerate(disease_classes, 1)
+            )),
+            ("scans", models.Scan.__table__, scan_rows()),
+            ("forum posts", models.ForumPost.__table__, post_rows()),
+            ("replies", models.ForumReply.__table__, reply_rows()),
+            ("likes", models.PostLike.__table__, like_rows()),
+        ):
+            start = time.perf_counter()
+            insert_chunks(conn, table, rows)
+            print(f"{name:12} {time.perf_counter() - start:6.1f}s", file=sys.stderr)
+
+        # the counters the API would have maintained, as user_stats.rebuild() computes them
+        insert_chunks(conn, models.UserStats.__table__, (
+            {"user_id": u, "posts_count": posts_per_user[u], "total_likes_received": likes_per_author[u],
+             "scans_count": scans_per_user[u]}
+            for u in range(1, users + 1)
+        ))
+        # fresh planner statistics, as a long-running database would have
+        conn.exec_driver_sql("ANALYZE")
+
+        return {
+            table.name: conn.execute(select(func.count()).select_from(table)).scalar()
+            for table in (models.User.__table__, models.Scan.__table__, models.ForumPost.__table__,
+                          models.ForumReply.__table__, models.PostLike.__table__)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", default=LOAD_TEST_DATABASE_URL)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every volume")
+    for name, default in VOLUMES.items():
+        parser.add_argument(f"--{name}", type=int, help=f"default {default:,} at scale 1")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    volumes = {
+        name: getattr(args, name) if getattr(args, name) is not None else max(1, int(default * args.scale))
+        for name, default in VOLUMES.items()
+    }
+    # durability doesn't matter for a throwaway load-test database
+    engine = create_db_engine(args.database_url, pragmas={**sqlite_pragmas(), "synchronous": "OFF"})
+    migrate.upgrade(engine)
+    print(seed(engine, volumes, args.seed))
+
+
+if __name__ == "__main__":
+    main()
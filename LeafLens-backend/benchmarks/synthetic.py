@@ -0,0 +1,20 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_jpeg(seed, size=(1024, 768), quality=90):
+    """A reproducible leaf-coloured JPEG so benchmarks run without the PlantNet dataset."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = np.array([60, 140, 50], dtype=np.float32) + rng.normal(0, 20, 3)
+    noise = rng.normal(0, 35, (h // 8 + 1, w // 8 + 1, 3))
+    pixels = np.clip(base + np.kron(noise, np.ones((8, 8, 1)))[:h, :w], 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def synthetic_batch(n, size=(1024, 768), seed=0):
+    return [synthetic_jpeg(seed + i, size) for i in range(n)]
@@ -0,0 +1,118 @@
+"""
+Query-plan regression check for the API's hot queries.
+
+Runs each query shape the endpoints use against a migrated SQLite database
+and fails if SQLite plans a full table scan or a temp B-tree sort for it, so
+a dropped index or a changed query shows up before it reaches production:
+
+    python check_query_plans.py                  # fresh database at migration head
+    python check_query_plans.py --database leaflens.db
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+import forum
+from disease_classes import disease_classes
+from label_registry import LabelRegistry
+import migrate
+import models
+import scan_jobs
+import user_stats
+
+# name -> (query, tables it may scan in full, whether it may sort in a temp B-tree);
+# ranked and filtered results are sorted by nature, over the matching rows only
+CHECKS = {
+    "forum listing, first page": (lambda db: forum.list_posts(db, limit=20), (), False),
+    "forum listing, next page": (lambda db: forum.list_posts(db, limit=20, cursor="2025-01-01 00:00:00_100"), (), False),
+    "forum listing, one user's posts": (lambda db: forum.list_posts(db, user_id=1, limit=5), (), False),
+    "forum listing, plant filter": (lambda db: forum.list_posts(db, plant="tomato", limit=20), (), True),
+    "forum search": (lambda db: forum.search_posts(db, "tomato blight", limit=20), ("hits",), True),
+    "replies of a post": (lambda db: db.query(models.ForumReply).filter(
+        models.ForumReply.post_id == 1).order_by(models.ForumReply.timestamp.asc()).all(), (), False),
+    "like count of a post": (lambda db: db.query(models.PostLike).filter(
+        models.PostLike.post_id == 1).count(), (), False),
+    "like of a user on a post": (lambda db: db.query(models.PostLike).filter(
+        models.PostLike.post_id == 1, models.PostLike.user_id == 1).first(), (), False),
+    "scans of a user": (lambda db: db.query(models.Scan).filter(models.Scan.user_id == 1).all(), (), False),
+    "scans of a plant": (lambda db: db.query(models.Scan).filter(models.Scan.plant_id == 1).all(), (), False),
+    "images of a scan": (lambda db: db.query(models.ScanImage).filter(models.ScanImage.scan_id == 1).all(), (), False),
+    "image by content hash": (lambda db: db.query(models.ScanImage).filter(
+        models.ScanImage.content_hash == "0" * 64).first(), (), False),
+    "disease ids of the model classes": (lambda db: LabelRegistry([], disease_classes).refresh_disease_ids(db), (), False),
+    "scan job results page": (lambda db: scan_jobs.results_page(db, 1, cursor=10), (), False),
+    "scan job, next images to claim": (lambda db: db.query(models.ScanJobItem.job_id).join(models.ScanJob).filter(
+        models.ScanJobItem.status == "pending", models.ScanJob.status.in_(scan_jobs.ACTIVE)
+    ).order_by(models.ScanJobItem.item_id).first(), (), False),
+    "scan job, blobs still referenced": (lambda db: scan_jobs.referenced_hashes(db, {"0" * 64}), (), False),
+    "scan job, images left": (lambda db: db.query(models.ScanJobItem.item_id).filter(
+        models.ScanJobItem.job_id == 1, models.ScanJobItem.status.in_(("pending", "running"))).first(), (), False),
+    "user stats": (lambda db: db.get(models.UserStats, 1), (), False),
+    "user stats rebuild, one user": (lambda db: user_stats.actual_counts(db, [1]), (), False),
+    "user stats rebuild, all users": (lambda db: user_stats.actual_counts(db), ("users", "scans", "forum_posts"), False),
+}
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def plan_problems(conn, statement, params, allowed_scans, allow_sort):
+    """Lines of the query plan of `statement` that scan a table or sort in a temp B-tree."""
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", params).all()
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) not in allowed_scans:
+            problems.append(detail)
+        elif "USE TEMP B-TREE FOR ORDER BY" in detail and not allow_sort:
+            problems.append(detail)
+    return problems
+
+
+def run_checks(engine):
+    failures = {}
+    for name, (query, allowed_scans, allow_sort) in CHECKS.items():
+        statements = []
+
+        def capture(conn, cursor, statement, params, context, executemany):
+            if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                statements.append((statement, params))
+
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            with Session(engine) as db:
+                query(db)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        with engine.connect() as conn:
+            problems = [p for s, params in statements for p in plan_problems(conn, s, params, allowed_scans, allow_sort)]
+        print(f"{'FAIL' if problems else 'ok  '}  {name}")
+        for problem in problems:
+            print(f"        {problem}")
+        if problems:
+            failures[name] = problems
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", help="SQLite file to check instead of a fresh one (migrated first)")
+    args = parser.parse_args()
+
+    path = args.database or os.path.join(tempfile.mkdtemp(), "plans.db")
+    engine = create_engine(f"sqlite:///{path}")
+    migrate.upgrade(engine)
+
+    failures = run_checks(engine)
+    print(f"{len(CHECKS) - len(failures)}/{len(CHECKS)} query plans ok")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,64 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "sqlite:///./leaflens.db" 
+from config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE,
+)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def sqlite_pragmas():
+    return {
+        "journal_mode": SQLITE_JOURNAL_MODE,
+        "synchronous": SQLITE_SYNCHRONOUS,
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -SQLITE_CACHE_SIZE_KB,  # negative means KiB rather than pages
+        "mmap_size": SQLITE_MMAP_SIZE,
+    }
+
+
+def create_db_engine(url=DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                     pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pragmas=None):
+    """
+    Engine for any SQLAlchemy URL with a bounded connection pool. SQLite
+    connections get `pragmas` (sqlite_pragmas() by default) as they are
+    opened; other databases are used as configured on the server.
+    """
+    url = make_url(url)
+    sqlite = url.get_backend_name() == "sqlite"
+    connect_args = {"check_same_thread": False} if sqlite else {}
+
+    if sqlite and url.database in (None, "", ":memory:"):
+        # an in-memory database lives in a single connection, pooling doesn't apply
+        engine = create_engine(url, connect_args=connect_args)
+    else:
+        engine = create_engine(
+            url,
+            connect_args=connect_args,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=True,
+        )
+
+    if sqlite:
+        set_sqlite_pragmas(engine, sqlite_pragmas() if pragmas is None else pragmas)
+    return engine
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
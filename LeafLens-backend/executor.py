@@ -0,0 +1,53 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import torch
+
+import inference
+
+
+def _init_process_worker(torch_threads):
+    torch.set_num_threads(torch_threads)
+    inference.load_runtime()
+
+
+class InferenceExecutor:
+    """
+    Runs decoding, transforms and forward passes off the event loop.
+
+    kind="thread": a thread pool sharing the models loaded in this process,
+    with torch intra-op threads bounded so the workers don't oversubscribe the CPU.
+    kind="process": a process pool where every worker loads the models once.
+    """
+
+    def __init__(self, kind="thread", workers=1, torch_threads=None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+        self._pool = None
+
+    def start(self):
+        if self.kind == "thread":
+            torch.set_num_threads(self.torch_threads)
+            inference.load_runtime()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        else:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+                initargs=(self.torch_threads,),
+            )
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn, *args):
+        """Await `fn(*args)` on the pool. `fn` must be a module-level function for process pools."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
@@ -0,0 +1,88 @@
+"""
+Export both classifiers as ahead-of-time artifacts for LEAFLENS_RUNTIME=torchscript/onnx.
+
+    python export_models.py [--out exported] [--formats torchscript,onnx]
+    python export_models.py --formats weights     # mmap-ready copies of the checkpoints
+
+The exported module is exactly what the eager runtime would serve, so
+LEAFLENS_ENGINE and LEAFLENS_FUSED_MODEL apply here as well.
+"""
+import argparse
+import os
+
+import torch
+
+import inference
+from config import ENGINE, EXPORT_DIR
+from runtime import Classifiers, TORCHSCRIPT_FILE, ONNX_FILE
+
+
+def export_torchscript(classifiers, example, path):
+    # optimize_for_inference bakes in prepacked mkldnn weights that can't be
+    # serialized, so the frozen graph is saved and TorchScriptRuntime optimizes it on load
+    with torch.no_grad():
+        traced = torch.jit.trace(classifiers, example)
+        frozen = torch.jit.freeze(traced)
+    frozen.save(path)
+
+
+def export_onnx(classifiers, example, path):
+    if ENGINE != "fp32":
+        raise RuntimeError("ONNX export needs LEAFLENS_ENGINE=fp32, quantize with ONNX Runtime tools instead")
+    torch.onnx.export(
+        classifiers,
+        example,
+        path,
+        input_names=["images"],
+        output_names=["species_logits", "disease_logits"],
+        dynamic_axes={"images": {0: "batch"}, "species_logits": {0: "batch"}, "disease_logits": {0: "batch"}},
+        opset_version=17,
+    )
+
+
+def export_weights(out):
+    """
+    Re-save both checkpoints as plain state dicts in the zip format, which
+    LEAFLENS_WEIGHTS_MMAP can memory-map; replace the originals with them.
+    """
+    species = torch.load(inference.SPECIES_CHECKPOINT, map_location="cpu")
+    disease = torch.load(inference.DISEASE_CHECKPOINT, map_location="cpu")
+    paths = []
+    for checkpoint, filename in (({"model": species["model"], "epoch": species.get("epoch")}, inference.SPECIES_CHECKPOINT),
+                                 (disease, inference.DISEASE_CHECKPOINT)):
+        path = os.path.join(out, os.path.basename(filename))
+        torch.save(checkpoint, path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=EXPORT_DIR)
+    parser.add_argument("--formats", default="torchscript,onnx")
+    args = parser.parse_args()
+    formats = args.formats.split(",")
+    os.makedirs(args.out, exist_ok=True)
+
+    if "weights" in formats:
+        for path in export_weights(args.out):
+            print(f"Wrote {path}")
+        if not {"torchscript", "onnx"} & set(formats):
+            return
+
+    inference.load_models()
+    classifiers = Classifiers(inference.species_model, inference.disease_model, inference.fused_model).eval()
+    example = torch.randn(2, 3, 224, 224)
+
+    if "torchscript" in formats:
+        path = os.path.join(args.out, TORCHSCRIPT_FILE)
+        export_torchscript(classifiers, example, path)
+        print(f"Wrote {path}")
+    if "onnx" in formats:
+        path = os.path.join(args.out, ONNX_FILE)
+        export_onnx(classifiers, example, path)
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
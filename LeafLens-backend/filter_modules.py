@@ -1,3 +1,7 @@
+from functools import lru_cache
+
+import torch
+
 from mapping import species_to_diseases, scientific_to_common
 
 def normalize_species_name(name: str):
@@ -12,14 +16,15 @@ def normalize_species_name(name: str):
             return common
     return None
 
+@lru_cache(maxsize=None)
+def allowed_disease_mask(species_pred, all_disease_classes):
+    """Bool mask over `all_disease_classes` (a tuple) of the diseases the species can have."""
+    allowed = set(species_to_diseases.get(normalize_species_name(species_pred), []))
+    return torch.tensor([cls in allowed for cls in all_disease_classes], dtype=torch.bool)
+
 def filter_disease_predictions(species_pred, all_disease_classes, disease_probs, top_k=3):
     """Filter disease predictions based on species."""
-    normalized = normalize_species_name(species_pred)
-    allowed = species_to_diseases.get(normalized, [])
-    results = [
-        (cls, prob)
-        for cls, prob in zip(all_disease_classes, disease_probs)
-        if cls in allowed
-    ]
-    results.sort(key=lambda x: x[1], reverse=True)
-    return results[:top_k]
+    mask = allowed_disease_mask(species_pred, tuple(all_disease_classes))
+    probs = torch.as_tensor(disease_probs, dtype=torch.float32).masked_fill(~mask, float("-inf"))
+    top_probs, top_idxs = torch.topk(probs, min(top_k, int(mask.sum())))
+    return [(all_disease_classes[i], p) for i, p in zip(top_idxs.tolist(), top_probs.tolist())]
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, func, or_, select, type_coerce
+
+import forum_search
+import models
+
+
+def stored_as_text(db):
+    """
+    Whether cursors compare the timestamp as stored text. SQLite keeps it as
+    text, and comparing it as stored matches the way ORDER BY sorts, also for
+    rows written without fractional seconds. Other databases compare the
+    typed column, which a cast to VARCHAR would break.
+    """
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def encode_cursor(timestamp, post_id):
+    """Opaque position of a post in the newest-first listing."""
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    return f"{timestamp}_{post_id}"
+
+
+def decode_cursor(cursor, as_text):
+    """(timestamp, post_id) of a cursor, the timestamp as stored text or as a datetime."""
+    try:
+        stored, post_id = cursor.rsplit("_", 1)
+        timestamp = datetime.fromisoformat(stored)
+        return stored if as_text else timestamp, int(post_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def like_count_column():
+    """Correlated COUNT of a post's likes, evaluated only for the rows of the page."""
+    return (
+        select(func.count(models.PostLike.like_id))
+        .where(models.PostLike.post_id == models.ForumPost.post_id)
+        .scalar_subquery()
+        .label("like_count")
+    )
+
+
+def contains_term(db, term, column):
+    """
+    Filter on posts whose `column` contains `term`: a phrase match through the
+    full-text index instead of an ILIKE '%term%' scan, or that ILIKE for input
+    without any words, like '++' or '#', that the index can't search for.
+    """
+    ids = forum_search.matching_post_ids(db, term, column)
+    if ids is None:
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return getattr(models.ForumPost, column).ilike(f"%{escaped}%", escape="\\")
+    return models.ForumPost.post_id.in_(ids)
+
+
+def list_posts(db, plant=None, disease=None, limit=50, cursor=None, user_id=None):
+    """
+    One page of forum posts, newest first, with their like counts, in a
+    single query. Pages are keyed on (timestamp, post_id) rather than an
+    offset, so every page costs the same however deep the client scrolls.
+    Returns the posts and the cursor of the next page, or None on the last one.
+    """
+    as_text = stored_as_text(db)
+    timestamp = type_coerce(models.ForumPost.timestamp, String) if as_text else models.ForumPost.timestamp
+    query = db.query(models.ForumPost, like_count_column(), timestamp)
+
+    if user_id is not None:
+        query = query.filter(models.ForumPost.user_id == user_id)
+
+    if plant:
+        query = query.filter(contains_term(db, plant, "title"))
+
+    if disease:
+        query = query.filter(contains_term(db, disease, "content"))
+
+    if cursor:
+        after, post_id = decode_cursor(cursor, as_text)
+        query = query.filter(or_(
+            timestamp < after,
+            and_(timestamp == after, models.ForumPost.post_id < post_id),
+        ))
+
+    rows = query.order_by(
+        models.ForumPost.timestamp.desc(), models.ForumPost.post_id.desc()
+    ).limit(limit + 1).all()
+
+    posts = []
+    for post, like_count, _ in rows[:limit]:
+        post.like_count = like_count
+        posts.append(post)
+    next_cursor = encode_cursor(rows[limit - 1][2], posts[-1].post_id) if len(rows) > limit else None
+    return posts, next_cursor
+
+
+def search_posts(db, q, limit=20, cursor=None, include_replies=True):
+    """
+    One page of posts matching `q`, best match first, each with its like
+    count and bm25 rank (lower is better). Returns the posts and the cursor
+    of the next page, or None on the last one.
+    """
+    after = None
+    if cursor:
+        try:
+            rank, post_id = cursor.rsplit("_", 1)
+            after = float(rank), int(post_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    hits = forum_search.ranked_post_ids(db, q, limit + 1, include_replies=include_replies, after=after)
+    page = hits[:limit]
+    rows = db.query(models.ForumPost, like_count_column()).filter(
+        models.ForumPost.post_id.in_([post_id for post_id, _ in page])
+    ).all()
+    by_id = {post.post_id: (post, like_count) for post, like_count in rows}
+
+    posts = []
+    for post_id, rank in page:
+        post, like_count = by_id[post_id]
+        post.like_count = like_count
+        post.rank = rank
+        posts.append(post)
+    next_cursor = f"{page[-1][1]!r}_{page[-1][0]}" if len(hits) > limit else None
+    return posts, next_cursor
@@ -0,0 +1,110 @@
+import re
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+# SQLite: external-content FTS5 tables forum_posts_fts / forum_replies_fts over
+# the forum tables, kept in sync by triggers. They, like the Postgres indexes
+# below, are created by the migrations (0001_baseline).
+
+# title matches count double in the ranking
+POST_WEIGHTS = "2.0, 1.0"
+
+# On Postgres the same searches run on tsvector expressions backed by GIN
+# indexes, so these must stay the expressions the migrations index
+PG_POST_VECTOR = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))"
+PG_COLUMN_VECTOR = "to_tsvector('english', coalesce({column}, ''))"
+
+
+def is_postgres(bind):
+    return bind.dialect.name == "postgresql"
+
+
+def match_query(terms, column=None, postgres=False):
+    """
+    FTS5 MATCH (or Postgres tsquery) expression for free text: every word
+    must appear, as a word prefix, so 'tomat blight' finds 'Tomato late
+    blight'. User input is never passed to the search engine as syntax.
+    """
+    words = re.findall(r"\w+", terms or "")
+    if not words:
+        raise HTTPException(status_code=400, detail="Search needs at least one word")
+    if postgres:
+        return " & ".join(f"{word}:*" for word in words)
+    prefix = f"{column} : " if column else ""
+    return " AND ".join(f'{prefix}"{word}"*' for word in words)
+
+
+def phrase_query(term, column=None, postgres=False):
+    """
+    FTS5 MATCH (or Postgres tsquery) expression for a filter value: its words
+    in order, quoted as one phrase whose last word is a prefix, so 'late-blig'
+    finds 'Late blight' but not 'blight came late'. None if `term` has no
+    letters or digits to match on.
+    """
+    words = re.findall(r"[^\W_]+", term or "")
+    if not words:
+        return None
+    if postgres:
+        return " <-> ".join(words[:-1] + [f"{words[-1]}:*"])
+    prefix = f"{column} : " if column else ""
+    return f'{prefix}"{" ".join(words)}"*'
+
+
+def matching_post_ids(db, term, column):
+    """
+    Subquery of the ids of posts whose `column` (title or content) contains
+    `term` as a phrase, or None if `term` has no words to search for.
+    """
+    postgres = is_postgres(db.get_bind())
+    match = phrase_query(term, column, postgres=postgres)
+    if match is None:
+        return None
+    if postgres:
+        sql = (f"SELECT post_id FROM forum_posts "
+               f"WHERE {PG_COLUMN_VECTOR.format(column=column)} @@ to_tsquery('english', :match)")
+        return text(sql).bindparams(match=match)
+    return text("SELECT rowid FROM forum_posts_fts WHERE forum_posts_fts MATCH :match").bindparams(match=match)
+
+
+def ranked_post_ids(db, terms, limit, include_replies=True, after=None):
+    """
+    (post_id, rank) of the best matching posts, best first, where a post
+    ranks by the better of its own bm25 score and that of its best matching
+    reply. `after` is the (rank, post_id) of the last row of the previous page.
+    """
+    postgres = is_postgres(db.get_bind())
+    if postgres:
+        # negated so that, as with bm25, lower is better
+        hits = [
+            "SELECT post_id, -ts_rank(setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B'), q) AS rank "
+            f"FROM forum_posts, to_tsquery('english', :match) q WHERE {PG_POST_VECTOR} @@ q"
+        ]
+        if include_replies:
+            reply_vector = PG_COLUMN_VECTOR.format(column="content")
+            hits.append(
+                f"SELECT post_id, -ts_rank({reply_vector}, q) AS rank "
+                f"FROM forum_replies, to_tsquery('english', :match) q WHERE {reply_vector} @@ q"
+            )
+    else:
+        hits = [
+            f"SELECT rowid AS post_id, bm25(forum_posts_fts, {POST_WEIGHTS}) AS rank "
+            "FROM forum_posts_fts WHERE forum_posts_fts MATCH :match"
+        ]
+        if include_replies:
+            hits.append(
+                "SELECT r.post_id, bm25(forum_replies_fts) AS rank FROM forum_replies_fts "
+                "JOIN forum_replies r ON r.reply_id = forum_replies_fts.rowid WHERE forum_replies_fts MATCH :match"
+            )
+    having = "HAVING MIN(rank) > :rank OR (MIN(rank) = :rank AND post_id < :post_id)" if after else ""
+    # MATERIALIZED keeps SQLite from flattening bm25() out of its MATCH query
+    sql = (
+        f"WITH hits AS MATERIALIZED ({' UNION ALL '.join(hits)}) "
+        f"SELECT post_id, MIN(rank) AS rank FROM hits "
+        f"GROUP BY post_id {having} ORDER BY rank, post_id DESC LIMIT :limit"
+    )
+    params = {"match": match_query(terms, postgres=postgres), "limit": limit}
+    if after:
+        params["rank"], params["post_id"] = after
+    return db.execute(text(sql), params).all()
@@ -0,0 +1,31 @@
+"""
+Several API workers on one machine, sharing the model weights:
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The app, models included (LEAFLENS_PRELOAD_MODELS), is imported once in the
+gunicorn master and the workers are forked from it, so the weights, label
+tables and the rest of the imported state are shared copy-on-write. With
+LEAFLENS_WEIGHTS_MMAP the weights are file-backed pages shared through the
+page cache as well. GET /health/memory reports each worker's RSS and PSS.
+
+For GET /metrics to cover all workers, set PROMETHEUS_MULTIPROC_DIR to an
+empty directory before starting gunicorn.
+"""
+import os
+
+os.environ.setdefault("LEAFLENS_PRELOAD_MODELS", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# model warm-up runs in each worker before it reports ready
+timeout = 120
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
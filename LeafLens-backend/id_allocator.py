@@ -0,0 +1,77 @@
+import threading
+
+from sqlalchemy import func, update
+
+import models
+
+
+class IdAllocator:
+    """
+    Hands out primary keys before their rows are written, so a write-behind
+    insert can still return its id right away.
+
+    Ids are reserved in blocks from the id_blocks table with one atomic
+    UPDATE, which keeps several worker processes from ever getting the same
+    id. Every insert into the table must take its id from here.
+    """
+
+    def __init__(self, session_factory, name, id_column, block_size=100):
+        self.session_factory = session_factory
+        self.name = name
+        self.id_column = id_column
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def next_id(self):
+        return self.next_ids(1)[0]
+
+    def next_ids(self, count):
+        """`count` ids under one lock, reserving further blocks as needed."""
+        with self._lock:
+            ids = []
+            while len(ids) < count:
+                if self._next >= self._end:
+                    self._next = self._reserve()
+                    self._end = self._next + self.block_size
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+            return ids
+
+    def reserved(self, id_value):
+        """Whether `id_value` was reserved by some process, i.e. may have been handed out."""
+        db = self.session_factory()
+        try:
+            next_id = db.query(models.IdBlock.next_id).filter(models.IdBlock.name == self.name).scalar()
+            return next_id is not None and id_value < next_id
+        finally:
+            db.close()
+
+    def _reserve(self):
+        db = self.session_factory()
+        try:
+            for _ in range(2):
+                # the UPDATE takes the write lock first, so concurrent reservations serialize
+                reserved = db.execute(
+                    update(models.IdBlock)
+                    .where(models.IdBlock.name == self.name)
+                    .values(next_id=models.IdBlock.next_id + self.block_size)
+                ).rowcount
+                if reserved:
+                    next_id = db.query(models.IdBlock.next_id).filter(models.IdBlock.name == self.name).scalar()
+                    db.commit()
+                    return next_id - self.block_size
+
+                # first use: start above the ids already in the table
+                start = (db.query(func.max(self.id_column)).scalar() or 0) + 1
+                db.add(models.IdBlock(name=self.name, next_id=start))
+                try:
+                    db.commit()
+                except Exception:
+                    # another process seeded it first
+                    db.rollback()
+            raise RuntimeError(f"Could not reserve ids for {self.name}")
+        finally:
+            db.close()
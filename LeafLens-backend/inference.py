@@ -0,0 +1,277 @@
+import functools
+import hashlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from disease_classes import disease_classes
+import quantization
+import preprocessing
+from runtime import Classifiers, EagerRuntime, TorchScriptRuntime, OnnxRuntime, TORCHSCRIPT_FILE, ONNX_FILE
+from config import (
+    FUSED_MODEL, ENGINE, CALIBRATION_ROOT, CALIBRATION_BATCHES, RUNTIME, EXPORT_DIR, MODEL_VERSION,
+    FAST_DECODE, WEIGHTS_MMAP,
+)
+
+# Everything in this module may run inside an inference worker (thread or
+# process), so it must not import main or touch the database.
+
+logger = logging.getLogger(__name__)
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+SPECIES_CHECKPOINT = "mobilenet_v3_large_weights_best_acc.tar"
+DISEASE_CHECKPOINT = "disease_model.pth"
+
+# torchvision (and with it every architecture it defines) is imported only
+# where it's needed: building the eager models and the reference transform.
+# The exported runtimes and the fast decoder serve without it.
+
+
+@functools.lru_cache(maxsize=None)
+def reference_transform():
+    """
+    Both models were trained on the same ImageNet-normalized 224x224 input,
+    so every image is decoded and transformed once and fed to both.
+    preprocessing.preprocess_batch produces the same input faster, this is the reference pipeline.
+    """
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406],
+                             [0.229, 0.224, 0.225])
+    ])
+
+species_model = None
+disease_model = None
+fused_model = None
+runtime = None
+
+
+class FusedClassifier(nn.Module):
+    """
+    Runs the MobileNetV3 feature extractor once and branches into the
+    species and disease classifier heads. Only valid when both models
+    were fine-tuned from the same frozen backbone (see backbones_match).
+    """
+
+    def __init__(self, species, disease):
+        super().__init__()
+        self.features = species.features
+        self.avgpool = species.avgpool
+        self.species_classifier = species.classifier
+        self.disease_classifier = disease.classifier
+
+    def forward(self, x):
+        x = self.features(x)
+        x = self.avgpool(x)
+        x = torch.flatten(x, 1)
+        return self.species_classifier(x), self.disease_classifier(x)
+
+
+def backbones_match(a, b):
+    """True if two MobileNetV3 models have identical feature extractor weights and buffers."""
+    a_state = a.features.state_dict()
+    b_state = b.features.state_dict()
+    if a_state.keys() != b_state.keys():
+        return False
+    return all(torch.equal(a_state[k], b_state[k].to(a_state[k].device)) for k in a_state)
+
+
+def read_checkpoint(path):
+    """
+    torch.load a checkpoint, memory-mapped when WEIGHTS_MMAP is on and the
+    models run on CPU. Returns (checkpoint, mapped). Mapped tensors are views
+    of the file's pages in the page cache, which every process mapping the
+    same file shares, and only the pages actually used are ever read.
+    """
+    if WEIGHTS_MMAP and device.type == "cpu":
+        try:
+            return torch.load(path, map_location=device, mmap=True), True
+        except RuntimeError as e:
+            # checkpoints saved before the zip format can't be mapped
+            logger.warning("Reading %s into memory, it can't be memory-mapped: %s", path, e)
+    return torch.load(path, map_location=device), False
+
+
+def build_species_model():
+    from torchvision.models import mobilenet_v3_large
+
+    if not os.path.exists(SPECIES_CHECKPOINT):
+        raise FileNotFoundError(SPECIES_CHECKPOINT)
+    model = mobilenet_v3_large(num_classes=1081)
+    checkpoint, mapped = read_checkpoint(SPECIES_CHECKPOINT)
+    # assign keeps the mapped tensors as the parameters instead of copying them into fresh ones
+    model.load_state_dict(checkpoint["model"], assign=mapped)
+    return model.to(device).eval()
+
+
+def build_disease_model():
+    from torchvision.models import mobilenet_v3_large
+
+    model = mobilenet_v3_large(weights=None)
+    model.classifier[3] = nn.Linear(model.classifier[3].in_features, len(disease_classes))
+    checkpoint, mapped = read_checkpoint(DISEASE_CHECKPOINT)
+    model.load_state_dict(checkpoint, strict=False, assign=mapped)
+    return model.to(device).eval()
+
+
+def load_models():
+    """Build both classifiers in Python from the checkpoints, once per process."""
+    global species_model, disease_model, fused_model
+    if species_model is not None:
+        return
+
+    # reading and unpickling the checkpoints mostly releases the GIL, so both load at once
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="load-model") as pool:
+        species_future = pool.submit(build_species_model)
+        disease_future = pool.submit(build_disease_model)
+        species_model, disease_model = species_future.result(), disease_future.result()
+
+    if FUSED_MODEL == "force" or (FUSED_MODEL == "auto" and backbones_match(species_model, disease_model)):
+        fused_model = FusedClassifier(species_model, disease_model).to(device).eval()
+        # drop the duplicate backbone so only one copy of its weights stays resident
+        disease_model.features = species_model.features
+
+    if ENGINE != "fp32":
+        if device.type != "cpu":
+            raise RuntimeError("Quantized engines only run on CPU")
+        calibration = None
+        if ENGINE == "static" and CALIBRATION_ROOT:
+            calibration = quantization.calibration_set(CALIBRATION_ROOT, n_batches=CALIBRATION_BATCHES)
+        if fused_model is not None:
+            fused_model = quantization.apply_engine(fused_model, ENGINE, calibration)
+        else:
+            species_model = quantization.apply_engine(species_model, ENGINE, calibration)
+            disease_model = quantization.apply_engine(disease_model, ENGINE, calibration)
+
+
+def load_runtime():
+    """Set up the configured inference backend, once per process."""
+    global runtime
+    if runtime is not None:
+        return
+
+    if RUNTIME == "eager":
+        load_models()
+        runtime = EagerRuntime(Classifiers(species_model, disease_model, fused_model), device)
+    elif RUNTIME == "torchscript":
+        runtime = TorchScriptRuntime(EXPORT_DIR, device)
+    elif RUNTIME == "onnx":
+        runtime = OnnxRuntime(EXPORT_DIR, threads=torch.get_num_threads())
+    else:
+        raise ValueError(f"Unknown inference runtime: {RUNTIME}")
+
+
+def model_version():
+    """
+    Identifies the weights and settings that produce the predictions, so cached
+    outputs are never reused after a checkpoint, engine, runtime or decoder change.
+    """
+    if MODEL_VERSION:
+        return MODEL_VERSION
+
+    if RUNTIME == "eager":
+        parts = [RUNTIME, ENGINE, FUSED_MODEL]
+        files = [SPECIES_CHECKPOINT, DISEASE_CHECKPOINT]
+    else:
+        parts = [RUNTIME]
+        files = [os.path.join(EXPORT_DIR, TORCHSCRIPT_FILE if RUNTIME == "torchscript" else ONNX_FILE)]
+    # the two decoders don't produce bit-identical inputs
+    parts.append(f"fast_decode={int(FAST_DECODE)}")
+    for path in files:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def preprocess(images):
+    """
+    Decode images (raw bytes or file paths) into one normalized input batch
+    shared by both models.
+    """
+    return preprocess_timed(images)[0]
+
+
+def preprocess_timed(images, out=None):
+    """
+    preprocess, plus the seconds spent decoding and transforming: (batch,
+    {stage: seconds}). The batch is written into `out` if given.
+    """
+    if FAST_DECODE:
+        ms = {}
+        batch = preprocessing.preprocess_batch(images, timings=ms, out=out)
+        return batch, {"decode": ms["decode"] / 1000, "transform": (ms["resize"] + ms["to_tensor"]) / 1000}
+
+    timings = {"decode": 0.0, "transform": 0.0}
+    tensors = []
+    for source in images:
+        start = time.perf_counter()
+        img = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source).convert("RGB")
+        decoded = time.perf_counter()
+        tensors.append(reference_transform()(img))
+        timings["decode"] += decoded - start
+        timings["transform"] += time.perf_counter() - decoded
+    return torch.stack(tensors, out=out), timings
+
+
+def forward(batch):
+    """Raw (species_logits, disease_logits) for an input batch."""
+    return runtime(batch)
+
+
+def run_models(batch):
+    """One forward pass of both models, returns the softmax outputs."""
+    return run_models_timed(batch)[0]
+
+
+def run_models_timed(batch):
+    """
+    run_models, plus the seconds spent per stage: species_forward and
+    disease_forward when the two models run separately, forward when one
+    module computes both (fused backbone, exported runtimes), and softmax.
+    """
+    timings = {}
+    classifiers = getattr(runtime, "classifiers", None)
+    with torch.no_grad():
+        start = time.perf_counter()
+        if classifiers is not None and classifiers.fused_model is None:
+            x = batch.to(device)
+            species_logits = classifiers.species_model(x)
+            species_done = time.perf_counter()
+            disease_logits = classifiers.disease_model(x)
+            timings["species_forward"] = species_done - start
+            timings["disease_forward"] = time.perf_counter() - species_done
+        else:
+            species_logits, disease_logits = forward(batch)
+            timings["forward"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        species_probs = torch.nn.functional.softmax(species_logits, dim=1).cpu()
+        disease_probs = torch.nn.functional.softmax(disease_logits, dim=1).cpu()
+        timings["softmax"] = time.perf_counter() - start
+    return (species_probs, disease_probs), timings
+
+
+def warm_up(batch_sizes):
+    """
+    One forward pass per batch size, so one-time setup (allocator pools,
+    kernel selection, lazy runtime initialization) happens before the first
+    request. Returns the seconds each pass took.
+    """
+    load_runtime()
+    timings = {}
+    for n in batch_sizes:
+        start = time.perf_counter()
+        run_models(torch.zeros((n, 3, preprocessing.INPUT_SIZE, preprocessing.INPUT_SIZE)))
+        timings[n] = time.perf_counter() - start
+    return timings
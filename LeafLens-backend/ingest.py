@@ -0,0 +1,146 @@
+import hashlib
+import io
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects upload requests to the given path prefixes with 413 once their
+    body exceeds `max_bytes`, checked against Content-Length up front and
+    against the bytes actually received for chunked uploads, before the
+    multipart parser spools any of it. The 413 is sent from here: the app
+    sees the client disconnect instead of the rest of the body, and
+    whatever it answers to that is dropped.
+    """
+
+    def __init__(self, app, max_bytes, path_prefixes):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefixes = tuple(path_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            return await self.app(scope, receive, send)
+
+        too_large = JSONResponse({"detail": "Upload too large"}, status_code=413)
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    return await JSONResponse({"detail": "Invalid Content-Length"}, status_code=400)(
+                        scope, receive, send
+                    )
+                if length > self.max_bytes:
+                    return await too_large(scope, receive, send)
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    rejected = True
+                    if not response_started:
+                        await too_large(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except Exception:
+            # the app failing on the cut-off body, the client already has its 413
+            if not rejected:
+                raise
+
+
+class RequestBudget:
+    """Bytes left for all files of one request."""
+
+    def __init__(self, max_bytes):
+        self.remaining = max_bytes
+
+    def consume(self, n):
+        self.remaining -= n
+        if self.remaining < 0:
+            raise HTTPException(status_code=413, detail="Upload too large")
+
+
+class IngestedImage:
+    """
+    One uploaded image: its SHA-256, size, and the source to decode it from,
+    either the raw bytes or, for large uploads, the request's spooled file.
+    """
+
+    def __init__(self, digest, size, source, filename=None):
+        self.digest = digest
+        self.size = size
+        self.source = source
+        self.filename = filename
+
+    def open(self):
+        """The source, rewound if it is a file, for one more read from the start."""
+        if hasattr(self.source, "seek"):
+            self.source.seek(0)
+        return self.source
+
+    def close(self):
+        if hasattr(self.source, "close"):
+            self.source.close()
+        self.source = None
+
+
+async def ingest_upload(file, budget, max_file_bytes, spool_bytes, chunk_bytes=1024 * 1024):
+    """
+    Read an UploadFile in chunks, hashing as it goes and enforcing the per-file
+    and per-request limits. Files up to `spool_bytes` are kept as bytes; larger
+    ones are read from the file the multipart parser already spooled them to
+    (a SpooledTemporaryFile, on disk past its threshold), which the result
+    takes over from the request. The caller must close() the result.
+    """
+    hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(chunk_bytes)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_file_bytes:
+                raise HTTPException(status_code=413, detail=f"{file.filename} is too large")
+            budget.consume(len(chunk))
+            hasher.update(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+                if size > spool_bytes:
+                    chunks = None
+    except BaseException:
+        await file.close()
+        raise
+
+    if chunks is not None:
+        await file.close()
+        return IngestedImage(hasher.hexdigest(), size, b"".join(chunks), file.filename)
+
+    # detached, so the form closing its files when the endpoint returns
+    # doesn't close it under a streaming response still reading it
+    source, file.file = file.file, io.BytesIO()
+    return IngestedImage(hasher.hexdigest(), size, source, file.filename)
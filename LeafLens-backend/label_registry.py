@@ -0,0 +1,152 @@
+import json
+import os
+import time
+
+import torch
+
+import metrics
+import models
+from disease_classes import disease_classes
+from disease_name_map import MODEL_TO_DB_DISEASE
+from filter_modules import normalize_species_name
+from mapping import species_to_diseases
+
+
+class LabelRegistry:
+    """
+    Everything needed to turn the models' probability vectors into a
+    response, resolved once at startup instead of per request:
+
+    - species_names: species class index -> display name
+    - allowed: [species, disease] bool mask of the diseases a species can
+      have, all False for species without mapped diseases
+    - disease_ids: disease class index -> diseases.disease_id (or None)
+
+    Each worker process has its own registry, so a diseases row added
+    through another worker is picked up lazily: a prediction whose disease
+    has no id yet triggers a refresh, at most every refresh_interval seconds.
+    """
+
+    refresh_interval = 30.0
+
+    def __init__(self, species_names, disease_names, species_diseases=species_to_diseases,
+                 normalize=normalize_species_name):
+        self.species_names = species_names
+        self.disease_names = disease_names
+        self.disease_ids = [None] * len(disease_names)
+        self.refreshed_at = None
+
+        disease_index = {name: i for i, name in enumerate(disease_names)}
+        self.allowed = torch.zeros((len(species_names), len(disease_names)), dtype=torch.bool)
+        for s, name in enumerate(species_names):
+            common = normalize(name)
+            if common in species_diseases:
+                for disease in species_diseases[common]:
+                    if disease in disease_index:
+                        self.allowed[s, disease_index[disease]] = True
+
+    @classmethod
+    def load(cls, metadata_dir="metada_files"):
+        with open(os.path.join(metadata_dir, "class_idx_to_species_id.json")) as f:
+            class_idx_to_species_id = json.load(f)
+        with open(os.path.join(metadata_dir, "plantnet300K_species_id_2_name.json")) as f:
+            species_id_to_name = json.load(f)
+
+        num_species = max(int(idx) for idx in class_idx_to_species_id) + 1
+        species_names = [
+            species_id_to_name.get(class_idx_to_species_id.get(str(idx), f"class_{idx}"), "Unknown Species")
+            for idx in range(num_species)
+        ]
+        return cls(species_names, list(disease_classes))
+
+    def refresh_disease_ids(self, db, predictions=()):
+        """
+        Resolve every disease class to its diseases row; call again after
+        diseases change. `predictions` made before the refresh get the new ids.
+        """
+        names = {MODEL_TO_DB_DISEASE.get(name) for name in self.disease_names} - {None}
+        ids = {}
+        for name, disease_id in db.query(models.Disease.name, models.Disease.disease_id).filter(
+            models.Disease.name.in_(names)
+        ):
+            ids[name] = min(disease_id, ids.get(name, disease_id))   # lowest id wins, like .first()
+        self.disease_ids = [ids.get(MODEL_TO_DB_DISEASE.get(name)) for name in self.disease_names]
+        self.refreshed_at = time.monotonic()
+        for prediction in predictions:
+            prediction.disease_id = self.disease_ids[prediction.disease_idx]
+
+    def unresolved(self, predictions):
+        """
+        The predictions whose top disease should have a diseases row but had
+        no id, if the last refresh is old enough to be worth redoing.
+        """
+        if self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.refresh_interval:
+            return []
+        return [
+            prediction for prediction in predictions
+            if prediction.disease_id is None and prediction.disease_idx is not None
+            and MODEL_TO_DB_DISEASE.get(self.disease_names[prediction.disease_idx])
+        ]
+
+    def filter_diseases(self, disease_probs, species_idxs):
+        """
+        [N, D] disease probabilities narrowed to the diseases each row's
+        species can have and renormalized to sum to 1, plus the [N, D] mask
+        of the diseases left in each row. Rows whose species has no mapped
+        diseases, or none with any probability, are left unchanged.
+        """
+        mask = self.allowed[species_idxs]
+        masked = disease_probs * mask
+        total = masked.sum(dim=1, keepdim=True)
+        filtered = total > 0
+        probs = torch.where(filtered, masked / total.clamp_min(1e-12), disease_probs)
+        return probs, mask | ~filtered
+
+    @metrics.timed("filter")
+    def predict(self, species_probs, disease_probs, topk_species, topk_disease):
+        """
+        Predictions for every image of a batch and for the batch average,
+        from [N, S] species and [N, D] disease softmax outputs. Diseases are
+        filtered by each row's top species over the whole disease vector,
+        and every step runs on all rows at once. Returns (per_image, average).
+        """
+        # rows 0..N-1 are the images, row N is the batch average
+        species = torch.cat([species_probs, species_probs.mean(dim=0, keepdim=True)])
+        diseases = torch.cat([disease_probs, disease_probs.mean(dim=0, keepdim=True)])
+
+        species_top, species_idxs = torch.topk(species, min(topk_species, species.size(1)), dim=1)
+        filtered, candidates = self.filter_diseases(diseases, species.argmax(dim=1))
+        disease_top, disease_idxs = torch.topk(filtered, min(topk_disease, filtered.size(1)), dim=1)
+        # a species with fewer than k diseases gets fewer than k results
+        disease_kept = candidates.gather(1, disease_idxs)
+
+        predictions = []
+        for s_idxs, s_top, d_idxs, d_top, d_kept in zip(
+            species_idxs.tolist(), species_top.tolist(),
+            disease_idxs.tolist(), disease_top.tolist(), disease_kept.tolist(),
+        ):
+            d_idxs = [i for i, kept in zip(d_idxs, d_kept) if kept]
+            predictions.append(Prediction(
+                [{"species": self.species_names[i], "confidence": round(p * 100, 2)} for i, p in zip(s_idxs, s_top)],
+                [{"disease": self.disease_names[i], "confidence": round(p * 100, 2)} for i, p in zip(d_idxs, d_top)],
+                self.disease_ids[d_idxs[0]] if d_idxs else None,
+                d_idxs[0] if d_idxs else None,
+            ))
+        return predictions[:-1], predictions[-1]
+
+
+class Prediction:
+    """Species and disease predictions for one image, or for a whole batch on average."""
+
+    def __init__(self, species, diseases, disease_id, disease_idx=None):
+        self.species = species          # [{"species", "confidence"}], best first
+        self.diseases = diseases        # [{"disease", "confidence"}], best first
+        self.disease_id = disease_id    # diseases row of the top disease, if any
+        self.disease_idx = disease_idx  # class index of the top disease, if any
+
+    @property
+    def confidence(self):
+        return self.diseases[0]["confidence"] if self.diseases else None
+
+    def as_dict(self):
+        return {"species_predictions": self.species, "disease_predictions": self.diseases}
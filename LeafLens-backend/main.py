@@ -1,36 +1,120 @@
-import os, shutil
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
 from typing import Optional, List
 
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+import startup
+
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Query, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 import models, schemas
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine
 
-from PIL import Image
 import torch
-import io
-from torchvision import transforms
-from torchvision.models import mobilenet_v3_large
-import torch.nn as nn
 
-import json
-from utils import load_model
-from filter_modules import normalize_species_name, filter_disease_predictions
-from disease_classes import disease_classes
-from mapping import species_to_diseases
-from disease_name_map import MODEL_TO_DB_DISEASE
+import inference
+from label_registry import LabelRegistry
+from batching import MicroBatcher
+from executor import InferenceExecutor
+from prediction_cache import PredictionCache
+from preprocessing import INPUT_SIZE
+import ingest
+import metrics
+import forum
+import migrate
+import user_stats
+import scan_jobs
+from storage import create_storage
+from id_allocator import IdAllocator
+from scan_writer import ScanWriter, PendingScan
+from starlette.concurrency import run_in_threadpool
+from config import (
+    MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS,
+    INFERENCE_EXECUTOR, INFERENCE_WORKERS, TORCH_THREADS, WARMUP_BATCH_SIZES, PRELOAD_MODELS,
+    PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_PATH, PREDICTION_CACHE_PRUNE_EVERY,
+    MAX_UPLOAD_BYTES, MAX_REQUEST_BYTES, UPLOAD_SPOOL_BYTES,
+    UPLOAD_DIR, STORAGE_BACKEND, S3_BUCKET, S3_ENDPOINT_URL, S3_PUBLIC_URL,
+    SCAN_WRITE_BATCH_SIZE, SCAN_WRITE_DELAY_MS, SCAN_ID_BLOCK_SIZE,
+    AUTO_MIGRATE,
+    JOB_MAX_REQUEST_BYTES, JOB_WORKERS, JOB_BATCH_SIZE, JOB_POLL_SECONDS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS,
+)
 
+logger = logging.getLogger(__name__)
 
+startup_report = startup.StartupReport()
+startup_report.mark("imports")
 
-Base.metadata.create_all(bind=engine)
+if PRELOAD_MODELS:
+    # loaded once by the process that imports the app, and inherited by the
+    # workers forked from it; a single intra-op thread until then, since an
+    # OpenMP pool started before a fork hangs in the children
+    with startup_report.phase("preload"):
+        torch.set_num_threads(1)
+        inference.load_runtime()
 
-app = FastAPI(title="LeafLens API")
+storage = create_storage(
+    STORAGE_BACKEND, UPLOAD_DIR,
+    s3_bucket=S3_BUCKET, s3_endpoint_url=S3_ENDPOINT_URL, s3_public_url=S3_PUBLIC_URL,
+)
+
+# every Scan insert takes its id from here, so ids can be handed out before the row is written
+scan_ids = IdAllocator(SessionLocal, "scans", models.Scan.scan_id, block_size=SCAN_ID_BLOCK_SIZE)
+scan_writer = ScanWriter(SessionLocal, storage, max_batch=SCAN_WRITE_BATCH_SIZE, max_delay_ms=SCAN_WRITE_DELAY_MS)
+
+
+async def load_models_and_warm_up():
+    """Load the models and run the warm-up passes in the background, then report ready."""
+    try:
+        # with a process pool the workers load their models during warm-up instead
+        with startup_report.phase("models"):
+            await run_in_threadpool(inference_executor.start)
+        with startup_report.phase("warm-up"):
+            if WARMUP_BATCH_SIZES:
+                timings = await asyncio.gather(*[
+                    inference_executor.run(inference.warm_up, WARMUP_BATCH_SIZES) for _ in range(INFERENCE_WORKERS)
+                ])
+                startup_report.details["warm_up_seconds"] = {
+                    str(n): round(max(t[n] for t in timings), 3) for n in WARMUP_BATCH_SIZES
+                }
+        await job_runner.start()
+        startup_report.set_ready()
+        logger.info("Ready after %.2fs: %s, memory: %s",
+                    startup_report.ready_after, startup_report.phases, startup.process_memory())
+    except Exception as e:
+        logger.exception("Loading the models failed")
+        startup_report.set_failed(e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the server starts accepting connections (and liveness checks) once this
+    # yields; the models keep loading in the background until readiness
+    with startup_report.phase("migrations"):
+        if AUTO_MIGRATE:
+            await run_in_threadpool(migrate.upgrade, engine)
+    with startup_report.phase("labels"):
+        await run_in_threadpool(refresh_labels)
+    await batcher.start()
+    await scan_writer.start()
+    warm_up = asyncio.create_task(load_models_and_warm_up())
+    yield
+    if not warm_up.done():
+        warm_up.cancel()
+    await job_runner.stop()
+    await batcher.stop()
+    await scan_writer.stop()
+    inference_executor.shutdown()
+    prediction_cache.close()
+
+
+app = FastAPI(title="LeafLens API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,9 +122,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# reject oversized uploads while they stream in, before the multipart parser spools them
+app.add_middleware(
+    ingest.UploadSizeLimitMiddleware,
+    max_bytes=MAX_REQUEST_BYTES,
+    path_prefixes=["/predict_species_and_disease"],
+)
+app.add_middleware(
+    ingest.UploadSizeLimitMiddleware,
+    max_bytes=JOB_MAX_REQUEST_BYTES,
+    path_prefixes=["/scan_jobs"],
+)
+# added last so it is outermost and times every request, rejected ones included
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 
 def get_db():
@@ -51,12 +151,58 @@ def get_db():
         db.close()
 
 
+async def require_user(db, user_id):
+    """404 for an unknown user. Scans are written after the response, too late to report a bad user_id."""
+    if not await run_in_threadpool(db.get, models.User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+
+def require_ready():
+    """Turn prediction requests away with 503 until the models are loaded and warmed up."""
+    if not startup_report.ready:
+        raise HTTPException(status_code=503, detail="Models are still loading", headers={"Retry-After": "5"})
+
+
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving; says nothing about the models."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+def readiness():
+    """200 once predictions can be served, 503 while starting up or if loading the models failed."""
+    if startup_report.ready:
+        return {"status": "ready"}
+    return JSONResponse({"status": startup_report.state, "detail": startup_report.error}, status_code=503)
+
+
+@app.get("/health/startup")
+def startup_breakdown():
+    """Where startup time went: imports, migrations, label registry, model loading and warm-up."""
+    return startup_report.as_dict()
+
+
+@app.get("/health/memory")
+def memory_usage():
+    """RSS and PSS of the worker process that answers; each worker reports its own pid."""
+    return startup.process_memory() or {"pid": os.getpid()}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint: per-stage and per-route latency, batch sizes, queue depth, cache hits."""
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
 @app.post("/users/", response_model=schemas.UserResponse)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     existing_user = db.query(models.User).filter(models.User.email == user.email).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     new_user = models.User(**user.dict())
+    new_user.stats = models.UserStats()
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
@@ -121,6 +267,8 @@ def create_disease(disease: schemas.DiseaseCreate, db: Session = Depends(get_db)
     db.add(new_disease)
     db.commit()
     db.refresh(new_disease)
+    # other workers pick the row up lazily, see LabelRegistry.unresolved
+    labels.refresh_disease_ids(db)
     return new_disease
 
 @app.get("/diseases/", response_model=List[schemas.DiseaseResponse])
@@ -137,12 +285,14 @@ def get_disease(disease_id: int, db: Session = Depends(get_db)):
 @app.post("/scans/", response_model=schemas.ScanResponse)
 def create_scan(scan: schemas.ScanCreate,user_id: int = Form(...), db: Session = Depends(get_db)):
     new_scan = models.Scan(
+        scan_id=scan_ids.next_id(),
         user_id=user_id,
         plant_id=scan.plant_id,
         disease_id=scan.disease_id,
         confidence_score=scan.confidence_score
     )
     db.add(new_scan)
+    user_stats.bump(db, user_id, scans_count=1)
     db.commit()
     db.refresh(new_scan)
 
@@ -170,8 +320,6 @@ def get_scans(
     return query.all()
 
 
-UPLOAD_DIR = "uploads"
-
 @app.delete("/scans/{scan_id}")
 def delete_scan(scan_id: int, db: Session = Depends(get_db)):
     scan = db.query(models.Scan).filter(models.Scan.scan_id == scan_id).first()
@@ -179,29 +327,46 @@ def delete_scan(scan_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Scan not found")
 
     db.delete(scan)
+    user_stats.bump(db, scan.user_id, scans_count=-1)
     db.commit()
     return {"detail": "Scan deleted successfully"}
 
 
 @app.post("/scan_images/", response_model=schemas.ScanImageResponse)
-def create_scan_image(
+async def create_scan_image(
     scan_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
+    try:
+        staged = await storage.stage(file, max_bytes=MAX_UPLOAD_BYTES)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # identical images are stored once and shared by every scan that uploads them
+    def find_existing():
+        existing = db.query(models.ScanImage).filter(models.ScanImage.content_hash == staged.digest)
+        return existing.filter(models.ScanImage.scan_id == scan_id).first(), existing.first()
+
+    def add_image(image_path):
+        new_image = models.ScanImage(scan_id=scan_id, image_path=image_path, content_hash=staged.digest)
+        db.add(new_image)
+        db.commit()
+        db.refresh(new_image)
+        return new_image
 
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    same_scan, shared = await run_in_threadpool(find_existing)
+    if same_scan:
+        await storage.discard(staged)
+        return same_scan
 
-    new_image = models.ScanImage(scan_id=scan_id, image_path=file_path)
-    db.add(new_image)
-    db.commit()
-    db.refresh(new_image)
+    if shared:
+        await storage.discard(staged)
+        image_path = shared.image_path
+    else:
+        image_path = await storage.commit(staged)
 
-    return new_image
+    return await run_in_threadpool(add_image, image_path)
 
 @app.get("/scan_images/", response_model=List[schemas.ScanImageResponse])
 def get_scan_images(db: Session = Depends(get_db)):
@@ -223,32 +388,42 @@ def get_recommendations(db: Session = Depends(get_db)):
 def create_forum_post(post: schemas.ForumPostCreate, db: Session = Depends(get_db)):
     new_post = models.ForumPost(**post.dict())
     db.add(new_post)
+    user_stats.bump(db, new_post.user_id, posts_count=1)
     db.commit()
     db.refresh(new_post)
     return new_post
 
 @app.get("/forum_posts/", response_model=List[schemas.ForumPostResponse])
 def get_forum_posts(
+    response: Response,
     plant: Optional[str] = None,
     disease: Optional[str] = None,
+    user_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.ForumPost)
-
-    if plant:
-        query = query.filter(models.ForumPost.title.ilike(f"%{plant}%"))
-
-    if disease:
-        query = query.filter(models.ForumPost.content.ilike(f"%{disease}%"))
-
-    posts = query.all()
-
-    for post in posts:
-        like_count = db.query(models.PostLike).filter(
-            models.PostLike.post_id == post.post_id
-        ).count()
-        post.like_count = like_count
+    """Newest posts first, `limit` per page; pass the X-Next-Cursor header back as `cursor` for the next page."""
+    posts, next_cursor = forum.list_posts(
+        db, plant=plant, disease=disease, limit=limit, cursor=cursor, user_id=user_id
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return posts
 
+@app.get("/forum_posts/search", response_model=List[schemas.ForumSearchResult])
+def search_forum_posts(
+    response: Response,
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_replies: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Full-text search over post titles and content (and replies), best match first, paged like /forum_posts/."""
+    posts, next_cursor = forum.search_posts(db, q, limit=limit, cursor=cursor, include_replies=include_replies)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return posts
 
 @app.put("/forum_posts/{post_id}", response_model=schemas.ForumPostResponse)
@@ -269,53 +444,251 @@ def delete_forum_post(post_id: int, db: Session = Depends(get_db)):
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
+    # its likes go with it (delete-orphan cascade)
+    likes = len(post.likes)
     db.delete(post)
+    user_stats.bump(db, post.user_id, posts_count=-1, total_likes_received=-likes)
     db.commit()
     return {"detail": "Post deleted successfully"}
 
 
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# class index -> species / disease / diseases row, and which diseases each species can have
+labels = LabelRegistry.load()
+
+
+def refresh_labels(predictions=()):
+    with SessionLocal() as db:
+        labels.refresh_disease_ids(db, predictions)
+
+
+async def resolve_disease_ids(predictions):
+    """Give predictions the ids of diseases rows added since this worker's last refresh."""
+    missing = labels.unresolved(predictions)
+    if missing:
+        await run_in_threadpool(refresh_labels, missing)
+
+
+inference_executor = InferenceExecutor(
+    kind=INFERENCE_EXECUTOR,
+    workers=INFERENCE_WORKERS,
+    torch_threads=TORCH_THREADS,
+)
+
+
+async def run_models(batch):
+    # timed inside the executor, which may be another process
+    outputs, timings = await inference_executor.run(inference.run_models_timed, batch)
+    metrics.observe_stages(timings)
+    return outputs
+
+
+# concurrent requests share one stacked forward pass
+batcher = MicroBatcher(
+    run_models,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_BATCH_WAIT_MS,
+    max_in_flight=INFERENCE_WORKERS,
+)
+
+prediction_cache = PredictionCache(
+    inference.model_version(),
+    max_entries=PREDICTION_CACHE_SIZE,
+    ttl_seconds=PREDICTION_CACHE_TTL,
+    persistent_path=PREDICTION_CACHE_PATH,
+    prune_every=PREDICTION_CACHE_PRUNE_EVERY,
+)
+
+
+async def preprocess_image(source, out=None):
+    """
+    Decode one image into a [3, H, W] input tensor. Given `out`, e.g. a row of
+    a batch, the thread executor decodes straight into it; a process pool's
+    result has to be copied back anyway.
+    """
+    if INFERENCE_EXECUTOR == "process":
+        if not isinstance(source, (bytes, bytearray)):
+            # open files don't cross to another process
+            source = await run_in_threadpool(source.read)
+        batch, timings = await inference_executor.run(inference.preprocess_timed, [source])
+        if out is not None:
+            batch = out[None].copy_(batch)
+    else:
+        batch, timings = await inference_executor.run(
+            inference.preprocess_timed, [source], out[None] if out is not None else None
+        )
+    metrics.observe_stages(timings)
+    return batch[0]
+
+
+async def read_upload(file, budget):
+    """Hash and spool one upload (see ingest.ingest_upload), within the request's byte budget."""
+    with metrics.timed("upload_read"):
+        return await ingest.ingest_upload(
+            file, budget,
+            max_file_bytes=MAX_UPLOAD_BYTES,
+            spool_bytes=UPLOAD_SPOOL_BYTES,
+        )
+
+
+# bulk jobs share the batcher with interactive requests
+job_runner = scan_jobs.JobRunner(
+    SessionLocal, storage, preprocess_image, batcher.submit, labels, scan_ids,
+    workers=JOB_WORKERS,
+    batch_size=JOB_BATCH_SIZE,
+    poll_seconds=JOB_POLL_SECONDS,
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+)
+
+
+async def predict_probs(files, staged=None):
+    """
+    Softmax outputs of both models for a list of uploads. Files are read one
+    at a time: each is hashed while it streams in, looked up in the prediction
+    cache and, on a miss, decoded straight into its row of the batch tensor,
+    after which its bytes are released. Peak memory stays roughly one upload
+    plus the batch tensor, whatever the number of files.
+
+    If `staged` is a list, every upload is also staged in image storage and
+    its StagedBlob appended, for the scan writer to save.
+    """
+    budget = ingest.RequestBudget(MAX_REQUEST_BYTES)
+    results = [None] * len(files)
+    keys = [None] * len(files)
+    misses = []
+    batch = None
+
+    try:
+        for i, file in enumerate(files):
+            upload = await read_upload(file, budget)
+            try:
+                if prediction_cache.enabled:
+                    keys[i] = prediction_cache.key(upload.digest)
+                    results[i] = await prediction_cache.get(keys[i])
+                if results[i] is None:
+                    if batch is None:
+                        batch = torch.empty((len(files), 3, INPUT_SIZE, INPUT_SIZE))
+                    await preprocess_image(upload.open(), out=batch[len(misses)])
+                    misses.append(i)
+                if staged is not None:
+                    staged.append(await storage.adopt(upload))
+            finally:
+                upload.close()
+
+        if misses:
+            species_probs, disease_probs = await batcher.submit(batch[:len(misses)])
+            for row, i in enumerate(misses):
+                results[i] = (species_probs[row], disease_probs[row])
+                if prediction_cache.enabled:
+                    await prediction_cache.put(keys[i], species_probs[row], disease_probs[row])
+    except BaseException:
+        # failed or cancelled before the scan writer took the blobs over
+        for blob in staged or []:
+            await storage.discard(blob)
+        raise
+
+    return torch.stack([r[0] for r in results]), torch.stack([r[1] for r in results])
+
+
+async def ingest_uploads(files):
+    """Hash and spool every upload of a request, within the request's byte budget."""
+    budget = ingest.RequestBudget(MAX_REQUEST_BYTES)
+    uploads = []
+    try:
+        for file in files:
+            uploads.append(await read_upload(file, budget))
+    except BaseException:
+        for upload in uploads:
+            upload.close()
+        raise
+    return uploads
 
-# --- Load species model ---
-species_model = mobilenet_v3_large(num_classes=1081)
-load_model(species_model, filename='mobilenet_v3_large_weights_best_acc.tar', use_gpu=torch.cuda.is_available())
-species_model.eval()
 
-with open("metada_files/class_idx_to_species_id.json") as f:
-    class_idx_to_species_id = json.load(f)
+async def stream_probs(uploads, staged):
+    """
+    Like predict_probs, but for ingested uploads, yielding (index,
+    species_probs, disease_probs) for each as soon as its outputs are ready,
+    in completion order. Each cache miss goes to the batcher as soon as it is
+    decoded, so results come back while later images are still decoding, and
+    misses decoded close together still share a forward pass. Every upload
+    is staged in image storage and its StagedBlob appended to `staged`.
+    """
+    pending = set()
 
-with open("metada_files/plantnet300K_species_id_2_name.json") as f:
-    species_id_to_name = json.load(f)
+    async def run(i, key, tensor):
+        species_probs, disease_probs = await batcher.submit(tensor.unsqueeze(0))
+        if key:
+            await prediction_cache.put(key, species_probs[0], disease_probs[0])
+        return i, species_probs[0], disease_probs[0]
 
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406],
-                         [0.229, 0.224, 0.225])
-])
+    try:
+        for i, upload in enumerate(uploads):
+            key = cached = None
+            if prediction_cache.enabled:
+                key = prediction_cache.key(upload.digest)
+                cached = await prediction_cache.get(key)
+            if cached is None:
+                tensor = await preprocess_image(upload.open())
+                pending.add(asyncio.create_task(run(i, key, tensor)))
+            staged.append(await storage.adopt(upload))
+
+            if cached is not None:
+                yield (i, *cached)
+            for task in [task for task in pending if task.done()]:
+                pending.discard(task)
+                yield task.result()
+
+        for task in asyncio.as_completed(pending):
+            yield await task
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        for blob in staged:
+            await storage.discard(blob)
+        raise
+    finally:
+        for upload in uploads:
+            upload.close()
 
-# --- Load disease model ---
-disease_model = mobilenet_v3_large(weights=None)
-disease_model.classifier[3] = nn.Linear(disease_model.classifier[3].in_features, len(disease_classes))
-disease_model.load_state_dict(torch.load("disease_model.pth", map_location=device), strict=False)
-disease_model.to(device)
-disease_model.eval()
 
-disease_transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406],
-                         [0.229, 0.224, 0.225])
-])
+@app.get("/scans/{scan_id}/status")
+def get_scan_status(scan_id: int, db: Session = Depends(get_db)):
+    """
+    Whether a scan returned by a prediction has been written yet: pending,
+    written or failed. Written scans and failures are read from the database,
+    so any worker answers for them. A scan still queued in another worker
+    has no row yet; its id was reserved, so it is reported pending too.
+    """
+    status = scan_writer.status(scan_id)
+    if status == "failed":
+        return {"scan_id": scan_id, "status": status, "detail": scan_writer.failed[scan_id]}
+    if status:
+        return {"scan_id": scan_id, "status": status}
+    if db.query(models.Scan.scan_id).filter(models.Scan.scan_id == scan_id).first():
+        return {"scan_id": scan_id, "status": "written"}
+    failure = db.get(models.ScanWriteFailure, scan_id)
+    if failure:
+        return {"scan_id": scan_id, "status": "failed", "detail": failure.error}
+    if scan_ids.reserved(scan_id):
+        return {"scan_id": scan_id, "status": "pending"}
+    raise HTTPException(status_code=404, detail="Scan not found")
+
+
+@app.get("/prediction_cache/stats")
+def get_prediction_cache_stats():
+    return prediction_cache.stats()
+
+PREDICTION_MODES = ("average", "per_image")
 
 # -- endpiont --
-@app.post("/predict_species_and_disease_batch")
+@app.post("/predict_species_and_disease_batch", dependencies=[Depends(require_ready)])
 async def predict_species_and_disease_batch(
     user_id: int = Form(...),
     files: List[UploadFile] = File(...),
     topk_species: int = 1,
     topk_disease: int = 4,
+    mode: str = "average",
     db: Session = Depends(get_db)
 ):
     
@@ -323,101 +696,215 @@ async def predict_species_and_disease_batch(
     Predict species and diseases for a batch of images.
     Disease predictions will be filtered based on the top predicted species.
     Works for both single and multiple images.
+
+    mode=average (default) blends the images into one prediction and one
+    scan; mode=per_image predicts each image on its own and creates one scan
+    per image, all from the same forward pass and written together.
     """
+    if mode not in PREDICTION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(PREDICTION_MODES)}")
     if not files:
         raise HTTPException(status_code=400, detail="No images uploaded")
+    await require_user(db, user_id)
 
-    species_tensors = []
-    disease_tensors = []
-
-    # --- Preprocess all images ---
-    for file in files:
-        img_bytes = await file.read()
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        species_tensors.append(transform(img))
-        disease_tensors.append(disease_transform(img))
-
-    # --- Stack tensors and move to device ---
-    species_batch = torch.stack(species_tensors).to(device)
-    disease_batch = torch.stack(disease_tensors).to(device)
-
-    # --- Species prediction ---
-    with torch.no_grad():
-        species_outputs = species_model(species_batch)
-        species_probs = torch.nn.functional.softmax(species_outputs, dim=1)
-        avg_species_probs = species_probs.mean(dim=0)
-        top_species_probs, top_species_idxs = torch.topk(avg_species_probs, topk_species)
-
-    species_predictions = []
-    for i in range(top_species_probs.size(0)):
-        class_idx = top_species_idxs[i].item()
-        species_id = class_idx_to_species_id.get(str(class_idx), f"class_{class_idx}")
-        species_name = species_id_to_name.get(species_id, "Unknown Species")
-        prob = top_species_probs[i].item() * 100
-        species_predictions.append({
-            "species": species_name,
-            "confidence": round(prob, 2)
-        })
-
-    top_species_name = species_predictions[0]["species"] if species_predictions else None
-
-    # --- Disease prediction ---
-    with torch.no_grad():
-        disease_outputs = disease_model(disease_batch)
-        disease_probs = torch.nn.functional.softmax(disease_outputs, dim=1)
-        avg_disease_probs = disease_probs.mean(dim=0)
-        top_disease_probs, top_disease_idxs = torch.topk(avg_disease_probs, topk_disease * 2)
-
-    raw_disease_predictions = []
-    for i in range(top_disease_probs.size(0)):
-        disease_name = disease_classes[top_disease_idxs[i].item()]
-        prob = top_disease_probs[i].item() * 100
-        raw_disease_predictions.append({
-            "disease": disease_name,
-            "confidence": round(prob, 2)
-        })
-
-    # --- Filter diseases based on top species ---
-    if top_species_name:
-        normalized = normalize_species_name(top_species_name)
-        if normalized and normalized in species_to_diseases:
-            allowed = set(species_to_diseases[normalized])
-            filtered = [pred for pred in raw_disease_predictions if pred["disease"] in allowed]
-            disease_predictions = filtered[:topk_disease] if filtered else raw_disease_predictions[:topk_disease]
-        else:
-            disease_predictions = raw_disease_predictions[:topk_disease]
-    else:
-        disease_predictions = raw_disease_predictions[:topk_disease]
+    # --- Softmax outputs per image (cached, or preprocessed off the event loop
+    # and batched with other concurrent requests) ---
+    staged = []
+    species_probs, disease_probs = await predict_probs(files, staged=staged)
 
-    # next step -> connect returned disease to disease in database
-    # create a scan entry using diseaseID that was found
-    # link the scan to scan/image to upload the image
+    try:
+        # --- Species and disease predictions, diseases filtered by the top species ---
+        per_image, average = labels.predict(species_probs, disease_probs, topk_species, topk_disease)
+        await resolve_disease_ids([*per_image, average])
+
+        # --- Hand the scans and their images to the write-behind stage ---
+        # ids are allocated now so the client gets them with the predictions,
+        # the Scan/ScanImage rows and image files are written in the background
+        count = len(files) if mode == "per_image" else 1
+        ids = await run_in_threadpool(scan_ids.next_ids, count)
+    except BaseException:
+        for blob in staged:
+            await storage.discard(blob)
+        raise
+
+    if mode == "average":
+        scan_writer.submit(PendingScan(
+            scan_id=ids[0],
+            user_id=user_id,
+            disease_id=average.disease_id,
+            confidence_score=average.confidence,
+            images=staged,
+        ))
+        return JSONResponse({"scan_id": ids[0], **average.as_dict()})
+
+    scan_writer.submit_all([
+        PendingScan(
+            scan_id=scan_id,
+            user_id=user_id,
+            disease_id=prediction.disease_id,
+            confidence_score=prediction.confidence,
+            images=[blob],
+        )
+        for scan_id, prediction, blob in zip(ids, per_image, staged)
+    ])
+    return JSONResponse({
+        "results": [
+            {"scan_id": scan_id, "filename": file.filename, **prediction.as_dict()}
+            for scan_id, prediction, file in zip(ids, per_image, files)
+        ]
+    })
 
-    raw_name = disease_predictions[0]["disease"]
-    mapped_name = MODEL_TO_DB_DISEASE.get(raw_name)
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
 
-    db_disease = db.query(models.Disease).filter(models.Disease.name == mapped_name).first()
-    disease_id = db_disease.disease_id if db_disease else None
-    top_confidence = disease_predictions[0]["confidence"]
 
+def stream_event(format, event, data):
+    if format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
 
-    new_scan = models.Scan(
-    user_id=user_id,
-    plant_id=None,  # optional: set if known
-    disease_id=disease_id,
-    confidence_score=top_confidence
-    )
-    db.add(new_scan)
-    db.commit()
-    db.refresh(new_scan)
-    scan_id = new_scan.scan_id
 
+@app.post("/predict_species_and_disease_batch/stream", dependencies=[Depends(require_ready)])
+async def predict_species_and_disease_stream(
+    user_id: int = Form(...),
+    files: List[UploadFile] = File(...),
+    topk_species: int = 1,
+    topk_disease: int = 4,
+    format: str = "sse",
+    db: Session = Depends(get_db),
+):
+    """
+    Streaming variant of /predict_species_and_disease_batch, as server-sent
+    events (format=sse) or one JSON object per line (format=ndjson):
+
+    - "image": {index, filename, species_predictions, disease_predictions}
+      for each image as soon as its outputs are ready, in completion order
+    - "summary": {scan_id, species_predictions, disease_predictions} for
+      the whole batch, as the non-streaming endpoint returns it, last
+
+    Upload limits are checked before the stream starts.
+    """
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STREAM_MEDIA_TYPES)}")
+    if not files:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    await require_user(db, user_id)
+
+    # read now: the request's files are closed once the endpoint returns
+    uploads = await ingest_uploads(files)
+    filenames = [file.filename for file in files]
+
+    async def events():
+        staged = []
+        species_rows = [None] * len(files)
+        disease_rows = [None] * len(files)
+        submitted = False
+        try:
+            async for i, species_probs, disease_probs in stream_probs(uploads, staged):
+                species_rows[i], disease_rows[i] = species_probs, disease_probs
+                per_image, _ = labels.predict(species_probs[None], disease_probs[None], topk_species, topk_disease)
+                yield stream_event(format, "image", {"index": i, "filename": filenames[i], **per_image[0].as_dict()})
+
+            _, average = labels.predict(torch.stack(species_rows), torch.stack(disease_rows), topk_species, topk_disease)
+            await resolve_disease_ids([average])
+            scan_id = await run_in_threadpool(scan_ids.next_id)
+            scan_writer.submit(PendingScan(
+                scan_id=scan_id,
+                user_id=user_id,
+                disease_id=average.disease_id,
+                confidence_score=average.confidence,
+                images=staged,
+            ))
+            submitted = True
+            yield stream_event(format, "summary", {"scan_id": scan_id, **average.as_dict()})
+        except BaseException:
+            if not submitted:
+                for blob in staged:
+                    await storage.discard(blob)
+            raise
+
+    # proxies must pass events through as they come instead of buffering the response
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type=STREAM_MEDIA_TYPES[format], headers=headers)
+
+
+async def delete_job_images(db, images):
+    """Delete the blobs stored for a scan job that was never created, unless other rows point to them."""
+    committed = {content_hash: image_path for _, image_path, content_hash in images}
+    if not committed:
+        return
+    try:
+        await run_in_threadpool(db.rollback)
+    except Exception:
+        logger.exception("Rolling back a rejected scan job failed")
+        return
+    await scan_jobs.delete_unreferenced(db, storage, committed)
+
+
+@app.post("/scan_jobs", status_code=202)
+async def submit_scan_job(
+    user_id: int = Form(...),
+    files: List[UploadFile] = File(...),
+    topk_species: int = 1,
+    topk_disease: int = 4,
+    db: Session = Depends(get_db)
+):
+    """
+    Queue a large set of images for prediction in the background. The images
+    are stored before the response; poll GET /scan_jobs/{job_id} for progress
+    and page through GET /scan_jobs/{job_id}/results. Every image gets its
+    own scan, as with mode=per_image.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    await require_user(db, user_id)
+
+    budget = ingest.RequestBudget(JOB_MAX_REQUEST_BYTES)
+    images = []
+    try:
+        for file in files:
+            upload = await read_upload(file, budget)
+            try:
+                blob = await storage.adopt(upload)
+            finally:
+                upload.close()
+            images.append((file.filename, await storage.commit(blob), blob.digest))
+
+        job = await run_in_threadpool(scan_jobs.create_job, db, user_id, images, topk_species, topk_disease)
+    except BaseException:
+        await delete_job_images(db, images)
+        raise
+    job_runner.wake()
+    return scan_jobs.job_status(job)
+
+
+@app.get("/scan_jobs/{job_id}")
+def get_scan_job(job_id: int, db: Session = Depends(get_db)):
+    return scan_jobs.job_status(scan_jobs.get_job(db, job_id))
+
+
+@app.get("/scan_jobs/{job_id}/results")
+def get_scan_job_results(
+    job_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """A page of the job's images in upload order; the next page's cursor is in X-Next-Cursor."""
+    job = scan_jobs.get_job(db, job_id)
+    items, next_cursor = scan_jobs.results_page(db, job_id, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return {**scan_jobs.job_status(job), "items": items}
+
+
+@app.post("/scan_jobs/{job_id}/cancel")
+async def cancel_scan_job(job_id: int, db: Session = Depends(get_db)):
+    job = await run_in_threadpool(scan_jobs.get_job, db, job_id)
+    job, dropped = await run_in_threadpool(scan_jobs.cancel_job, db, job)
+    await scan_jobs.delete_unreferenced(db, storage, dropped)
+    return scan_jobs.job_status(job)
 
-    return JSONResponse({
-        "scan_id": scan_id,
-        "species_predictions": species_predictions,
-        "disease_predictions": disease_predictions
-    })
 
 @app.post("/forum_posts/{post_id}/replies", response_model=schemas.ForumReplyResponse)
 def create_forum_reply(post_id: int, reply: schemas.ForumReplyCreate, db: Session = Depends(get_db)):
@@ -476,11 +963,13 @@ def toggle_like_on_post(post_id: int, like_payload: schemas.PostLikeCreate, db:
     if existing_like:
         # unlike
         db.delete(existing_like)
+        user_stats.bump(db, post.user_id, total_likes_received=-1)
         db.commit()
         liked = False
     else:
         new_like = models.PostLike(post_id=post_id, user_id=like_payload.user_id)
         db.add(new_like)
+        user_stats.bump(db, post.user_id, total_likes_received=1)
         try:
             db.commit()
         except Exception as e:
@@ -496,25 +985,19 @@ def toggle_like_on_post(post_id: int, like_payload: schemas.PostLikeCreate, db:
 
 @app.get("/users/{user_id}/stats", response_model=schemas.UserStats)
 def get_user_stats(user_id: int, db: Session = Depends(get_db)):
-    # ensure user exists
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # number of posts by this user
-    posts_count = db.query(models.ForumPost).filter(models.ForumPost.user_id == user_id).count()
-
-    # total likes received across all posts
-    total_likes_received = db.query(func.count(models.PostLike.like_id)).join(
-        models.ForumPost, models.PostLike.post_id == models.ForumPost.post_id
-    ).filter(models.ForumPost.user_id == user_id).scalar() or 0
-
-    # number of scans
-    scans_count = db.query(models.Scan).filter(models.Scan.user_id == user_id).count()
+    # counters maintained by the endpoints that change them, see user_stats.py
+    stats = db.get(models.UserStats, user_id)
+    if stats is None:
+        # users created outside the API have no row yet
+        if not db.query(models.User).filter(models.User.user_id == user_id).first():
+            raise HTTPException(status_code=404, detail="User not found")
+        user_stats.rebuild(db, [user_id])
+        db.commit()
+        stats = db.get(models.UserStats, user_id)
 
     return schemas.UserStats(
         user_id=user_id,
-        posts_count=posts_count,
-        total_likes_received=total_likes_received,
-        scans_count=scans_count
+        posts_count=stats.posts_count,
+        total_likes_received=stats.total_likes_received,
+        scans_count=stats.scans_count
     )
@@ -0,0 +1,90 @@
+"""
+Prometheus metrics of the API, served in the text exposition format at
+GET /metrics. Under gunicorn, point PROMETHEUS_MULTIPROC_DIR at an empty
+directory (wiped on every deploy) so each scrape adds up all workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# seconds, from sub-millisecond stages (filtering, cache lookups) to slow uploads and full batches
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# upload_read, decode, transform, species_forward / disease_forward (or forward
+# when one module computes both), softmax, filter, db_commit
+STAGE_SECONDS = Histogram(
+    "leaflens_stage_seconds", "Time spent in each stage of the prediction path", ["stage"], buckets=LATENCY_BUCKETS,
+)
+BATCH_SIZE = Histogram(
+    "leaflens_batch_size", "Images per forward pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+QUEUE_DEPTH = Gauge(
+    "leaflens_batcher_queue_depth", "Images waiting for a forward pass", multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "leaflens_prediction_cache_lookups", "Prediction cache lookups by result: hit, persistent_hit or miss", ["result"],
+)
+REQUEST_SECONDS = Histogram(
+    "leaflens_http_request_duration_seconds", "Request latency per route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+
+
+def observe_stages(timings):
+    """Record a {stage: seconds} dict, e.g. measured inside an inference worker."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def render():
+    """(body, content type) of a scrape."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class RequestMetricsMiddleware:
+    """
+    Latency of every HTTP request, labeled with the route's path template
+    (/users/{user_id}, not /users/42) so the number of series stays bounded.
+    Requests that match no route, static files included, share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched route in the scope on its way in
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
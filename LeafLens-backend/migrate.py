@@ -0,0 +1,62 @@
+"""
+Schema migrations, managed with Alembic (see migrations/).
+
+The API upgrades its database to the latest revision at startup unless
+LEAFLENS_AUTO_MIGRATE=0, in which case run it as a deploy step instead:
+
+    python migrate.py            # or: alembic upgrade head
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # Windows: no cross-process lock for SQLite, run one worker there
+    fcntl = None
+
+from alembic import command
+from alembic.config import Config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def alembic_config(connection=None):
+    config = Config(os.path.join(HERE, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(HERE, "migrations"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+# any fixed key, shared by every process migrating the same Postgres database
+PG_MIGRATION_LOCK = 7126
+
+
+@contextmanager
+def sqlite_migration_lock(engine):
+    """Exclusive lock on <database>.migrate.lock, so only one process migrates a SQLite file at a time."""
+    database = engine.url.database
+    if engine.dialect.name != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        yield
+        return
+    with open(f"{database}.migrate.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def upgrade(engine, revision="head"):
+    """
+    Migrate the database behind `engine` to `revision`. Safe to call from
+    several workers starting at once: they take turns, and all but the first
+    find the database already up to date.
+    """
+    with sqlite_migration_lock(engine), engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql(f"SELECT pg_advisory_xact_lock({PG_MIGRATION_LOCK})")
+        command.upgrade(alembic_config(connection), revision)
+
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
@@ -0,0 +1,58 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+import models  # noqa: F401, registers the tables on Base.metadata
+from database import Base, engine
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# maintained by the migrations themselves, not by the models
+UNMANAGED_TABLES = ("forum_posts_fts", "forum_replies_fts", "weather", "sqlite_sequence")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "table" and name.startswith(UNMANAGED_TABLES):
+        return False
+    return True
+
+
+def configure(**kwargs):
+    context.configure(
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite can't ALTER most things in place, batch mode recreates the table
+        render_as_batch=True,
+        **kwargs,
+    )
+
+
+def run_migrations_offline():
+    configure(url=config.attributes.get("url", engine.url), literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # migrate.upgrade() passes the connection of the engine it's migrating
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    with engine.connect() as connection:
+        configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,203 @@
+"""Baseline: the schema create_all and the startup fix-ups used to build
+
+Brings a database created before migrations existed (by create_all, or by
+the original SQL script) up to the same schema as a fresh one: missing
+tables, columns and indexes are added, nothing existing is changed.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+metadata = sa.MetaData()
+
+sa.Table(
+    "users", metadata,
+    sa.Column("user_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("name", sa.String(100), nullable=False),
+    sa.Column("email", sa.String(255), unique=True, nullable=False),
+    sa.Column("password_hash", sa.String(255), nullable=False),
+    sa.Column("user_type", sa.String(20), nullable=False),
+)
+sa.Table(
+    "plants", metadata,
+    sa.Column("plant_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("name", sa.String(100), nullable=False),
+    sa.Column("common_name", sa.String(255)),
+    sa.Column("species", sa.String(255)),
+)
+sa.Table(
+    "diseases", metadata,
+    sa.Column("disease_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("name", sa.String(100), nullable=False),
+    sa.Column("symptoms", sa.Text),
+    sa.Column("treatments", sa.Text),
+    sa.Column("prevention", sa.Text),
+)
+sa.Table(
+    "scans", metadata,
+    sa.Column("scan_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("user_id", sa.Integer, sa.ForeignKey("users.user_id"), nullable=False),
+    sa.Column("plant_id", sa.Integer, sa.ForeignKey("plants.plant_id")),
+    sa.Column("disease_id", sa.Integer, sa.ForeignKey("diseases.disease_id")),
+    sa.Column("date", sa.DateTime),
+    sa.Column("confidence_score", sa.Float),
+)
+sa.Table(
+    "scan_images", metadata,
+    sa.Column("image_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("scan_id", sa.Integer, sa.ForeignKey("scans.scan_id"), nullable=False),
+    sa.Column("image_path", sa.String(255), nullable=False),
+    sa.Column("content_hash", sa.String(64), index=True),
+    sa.Column("uploaded_at", sa.DateTime),
+)
+sa.Table(
+    "recommendations", metadata,
+    sa.Column("rec_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("disease_id", sa.Integer, sa.ForeignKey("diseases.disease_id")),
+    sa.Column("recommendation_text", sa.Text),
+)
+sa.Table(
+    "forum_posts", metadata,
+    sa.Column("post_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("user_id", sa.Integer, sa.ForeignKey("users.user_id")),
+    sa.Column("title", sa.String(255)),
+    sa.Column("content", sa.Text),
+    sa.Column("timestamp", sa.DateTime),
+    sa.Index("ix_forum_posts_timestamp_post_id", "timestamp", "post_id"),
+)
+sa.Table(
+    "post_likes", metadata,
+    sa.Column("like_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("post_id", sa.Integer, sa.ForeignKey("forum_posts.post_id"), nullable=False),
+    sa.Column("user_id", sa.Integer, sa.ForeignKey("users.user_id"), nullable=False),
+    sa.Column("timestamp", sa.DateTime),
+    sa.UniqueConstraint("post_id", "user_id", name="uq_post_user_like"),
+)
+sa.Table(
+    "forum_replies", metadata,
+    sa.Column("reply_id", sa.Integer, primary_key=True, index=True),
+    sa.Column("post_id", sa.Integer, sa.ForeignKey("forum_posts.post_id"), nullable=False),
+    sa.Column("user_id", sa.Integer, sa.ForeignKey("users.user_id"), nullable=False),
+    sa.Column("content", sa.Text, nullable=False),
+    sa.Column("timestamp", sa.DateTime),
+)
+sa.Table(
+    "id_blocks", metadata,
+    sa.Column("name", sa.String(50), primary_key=True),
+    sa.Column("next_id", sa.Integer, nullable=False),
+)
+sa.Table(
+    "user_stats", metadata,
+    sa.Column("user_id", sa.Integer, sa.ForeignKey("users.user_id"), primary_key=True),
+    sa.Column("posts_count", sa.Integer, nullable=False),
+    sa.Column("total_likes_received", sa.Integer, nullable=False),
+    sa.Column("scans_count", sa.Integer, nullable=False),
+)
+
+# columns added to existing tables after their first release
+ADDED_COLUMNS = [("scan_images", "content_hash")]
+
+# The search indexes, which only the migrations create, and the user_stats
+# backfill as of this revision, written out rather than imported from
+# user_stats, which keeps changing.
+
+# SQLite: external-content FTS5 tables kept in sync by triggers
+FTS_TABLES = {
+    "forum_posts_fts": (
+        "CREATE VIRTUAL TABLE forum_posts_fts USING fts5("
+        "title, content, content='forum_posts', content_rowid='post_id', tokenize='porter unicode61')",
+        [
+            "CREATE TRIGGER IF NOT EXISTS forum_posts_fts_ai AFTER INSERT ON forum_posts BEGIN "
+            "INSERT INTO forum_posts_fts(rowid, title, content) VALUES (new.post_id, new.title, new.content); END",
+            "CREATE TRIGGER IF NOT EXISTS forum_posts_fts_ad AFTER DELETE ON forum_posts BEGIN "
+            "INSERT INTO forum_posts_fts(forum_posts_fts, rowid, title, content) "
+            "VALUES ('delete', old.post_id, old.title, old.content); END",
+            "CREATE TRIGGER IF NOT EXISTS forum_posts_fts_au AFTER UPDATE OF title, content ON forum_posts BEGIN "
+            "INSERT INTO forum_posts_fts(forum_posts_fts, rowid, title, content) "
+            "VALUES ('delete', old.post_id, old.title, old.content); "
+            "INSERT INTO forum_posts_fts(rowid, title, content) VALUES (new.post_id, new.title, new.content); END",
+        ],
+    ),
+    "forum_replies_fts": (
+        "CREATE VIRTUAL TABLE forum_replies_fts USING fts5("
+        "content, content='forum_replies', content_rowid='reply_id', tokenize='porter unicode61')",
+        [
+            "CREATE TRIGGER IF NOT EXISTS forum_replies_fts_ai AFTER INSERT ON forum_replies BEGIN "
+            "INSERT INTO forum_replies_fts(rowid, content) VALUES (new.reply_id, new.content); END",
+            "CREATE TRIGGER IF NOT EXISTS forum_replies_fts_ad AFTER DELETE ON forum_replies BEGIN "
+            "INSERT INTO forum_replies_fts(forum_replies_fts, rowid, content) "
+            "VALUES ('delete', old.reply_id, old.content); END",
+            "CREATE TRIGGER IF NOT EXISTS forum_replies_fts_au AFTER UPDATE OF content ON forum_replies BEGIN "
+            "INSERT INTO forum_replies_fts(forum_replies_fts, rowid, content) "
+            "VALUES ('delete', old.reply_id, old.content); "
+            "INSERT INTO forum_replies_fts(rowid, content) VALUES (new.reply_id, new.content); END",
+        ],
+    ),
+}
+
+# Postgres: GIN indexes on the tsvector expressions the searches use
+PG_SEARCH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_forum_posts_search ON forum_posts USING GIN "
+    "(to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_forum_posts_title_search ON forum_posts USING GIN "
+    "(to_tsvector('english', coalesce(title, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_forum_posts_content_search ON forum_posts USING GIN "
+    "(to_tsvector('english', coalesce(content, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_forum_replies_search ON forum_replies USING GIN "
+    "(to_tsvector('english', coalesce(content, '')))",
+]
+
+BACKFILL_USER_STATS = """
+INSERT INTO user_stats (user_id, posts_count, total_likes_received, scans_count)
+SELECT u.user_id,
+       (SELECT COUNT(*) FROM forum_posts p WHERE p.user_id = u.user_id),
+       (SELECT COUNT(*) FROM post_likes l JOIN forum_posts p ON p.post_id = l.post_id WHERE p.user_id = u.user_id),
+       (SELECT COUNT(*) FROM scans s WHERE s.user_id = u.user_id)
+FROM users u
+"""
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+    backfill_user_stats = "user_stats" not in existing
+
+    metadata.create_all(bind, checkfirst=True)
+
+    for table, column in ADDED_COLUMNS:
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            op.add_column(table, metadata.tables[table].c[column].copy())
+    for table in metadata.tables.values():
+        if table.name in existing:
+            for index in table.indexes:
+                index.create(bind, checkfirst=True)
+
+    if bind.dialect.name == "postgresql":
+        for index in PG_SEARCH_INDEXES:
+            op.execute(index)
+    else:
+        for table, (create, triggers) in FTS_TABLES.items():
+            if table not in existing:
+                op.execute(create)
+                op.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            for trigger in triggers:
+                op.execute(trigger)
+
+    if backfill_user_stats:
+        op.execute(BACKFILL_USER_STATS)
+
+
+def downgrade():
+    # Deliberately a no-op: this revision also adopts databases that were
+    # created before migrations existed, so dropping what it creates would
+    # drop their data too. Upgrading again is safe, every step checks first.
+    pass
@@ -0,0 +1,40 @@
+"""Secondary indexes for the hot foreign-key lookups
+
+Chosen from the queries the API actually runs:
+- scans of a user (newest first) and user_stats rebuilds: (user_id, date)
+- scans of a plant: plant_id
+- images of a scan, loaded with every scan and on delete: scan_id
+- replies of a post, oldest first: (post_id, timestamp)
+- posts of a user (profile, user_stats rebuilds): (user_id, timestamp)
+- disease by name, on every prediction: name
+Likes of a post are already served by the (post_id, user_id) unique index.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_scans_user_id_date", "scans", ["user_id", "date"]),
+    ("ix_scans_plant_id", "scans", ["plant_id"]),
+    ("ix_scan_images_scan_id", "scan_images", ["scan_id"]),
+    ("ix_forum_replies_post_id_timestamp", "forum_replies", ["post_id", "timestamp"]),
+    ("ix_forum_posts_user_id_timestamp", "forum_posts", ["user_id", "timestamp"]),
+    ("ix_diseases_name", "diseases", ["name"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,52 @@
+"""Scan jobs: bulk prediction jobs and their images
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scan_jobs",
+        sa.Column("job_id", sa.Integer, primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("total", sa.Integer, nullable=False),
+        sa.Column("processed", sa.Integer, nullable=False),
+        sa.Column("failed", sa.Integer, nullable=False),
+        sa.Column("topk_species", sa.Integer, nullable=False),
+        sa.Column("topk_disease", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("finished_at", sa.DateTime),
+    )
+    op.create_table(
+        "scan_job_items",
+        sa.Column("item_id", sa.Integer, primary_key=True, index=True),
+        sa.Column("job_id", sa.Integer, sa.ForeignKey("scan_jobs.job_id"), nullable=False),
+        sa.Column("position", sa.Integer, nullable=False),
+        sa.Column("filename", sa.String(255)),
+        sa.Column("image_path", sa.String(255), nullable=False),
+        sa.Column("content_hash", sa.String(64)),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("worker", sa.String(32)),
+        sa.Column("claimed_at", sa.DateTime),
+        sa.Column("scan_id", sa.Integer, sa.ForeignKey("scans.scan_id")),
+        sa.Column("result", sa.Text),
+        sa.Column("error", sa.Text),
+        sa.UniqueConstraint("job_id", "position", name="uq_scan_job_item_position"),
+    )
+    op.create_index("ix_scan_job_items_job_id_status", "scan_job_items", ["job_id", "status"])
+    op.create_index("ix_scan_job_items_status_item_id", "scan_job_items", ["status", "item_id"])
+
+
+def downgrade():
+    op.drop_table("scan_job_items")
+    op.drop_table("scan_jobs")
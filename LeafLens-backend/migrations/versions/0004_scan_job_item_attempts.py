@@ -0,0 +1,23 @@
+"""Scan job items: count the attempts at each image
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("scan_job_items") as batch:
+        batch.add_column(sa.Column("attempts", sa.Integer, nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("scan_job_items") as batch:
+        batch.drop_column("attempts")
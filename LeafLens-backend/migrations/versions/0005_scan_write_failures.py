@@ -0,0 +1,27 @@
+"""Scan write failures: scans the write-behind stage could not save
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scan_write_failures",
+        sa.Column("scan_id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("error", sa.Text, nullable=False),
+        sa.Column("failed_at", sa.DateTime),
+    )
+
+
+def downgrade():
+    op.drop_table("scan_write_failures")
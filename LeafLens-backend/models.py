@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Table, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Table, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -14,6 +14,7 @@ class User(Base):
     scans = relationship("Scan", back_populates="user")
     forum_posts = relationship("ForumPost", back_populates="user")
     forum_replies = relationship("ForumReply", back_populates="user")
+    stats = relationship("UserStats", uselist=False, cascade="all, delete-orphan")
     post_likes = relationship("PostLike", back_populates="user")
 
 
@@ -30,7 +31,7 @@ class Plant(Base):
 class Disease(Base):
     __tablename__ = "diseases"
     disease_id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), nullable=False)
+    name = Column(String(100), nullable=False, index=True)   # looked up on every prediction
     symptoms = Column(Text)
     treatments = Column(Text)
     prevention = Column(Text)
@@ -51,14 +52,20 @@ class Scan(Base):
     user = relationship("User", back_populates="scans")
     plant = relationship("Plant", back_populates="scans")
     disease = relationship("Disease", back_populates="scans")
-    images = relationship("ScanImage", back_populates="scan")
+    images = relationship("ScanImage", back_populates="scan", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_scans_user_id_date", "user_id", "date"),
+        Index("ix_scans_plant_id", "plant_id"),
+    )
 
 
 class ScanImage(Base):
     __tablename__ = "scan_images"
     image_id = Column(Integer, primary_key=True, index=True)
-    scan_id = Column(Integer, ForeignKey("scans.scan_id"), nullable=False)
+    scan_id = Column(Integer, ForeignKey("scans.scan_id"), nullable=False, index=True)
     image_path = Column(String(255), nullable=False)
+    content_hash = Column(String(64), index=True)   # sha256 of the image bytes, shared by duplicate uploads
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
     scan = relationship("Scan", back_populates="images")
@@ -85,6 +92,12 @@ class ForumPost(Base):
     replies = relationship("ForumReply", back_populates="post", cascade="all, delete-orphan")
     likes = relationship("PostLike", back_populates="post", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # newest-first keyset pagination of the forum listing
+        Index("ix_forum_posts_timestamp_post_id", "timestamp", "post_id"),
+        Index("ix_forum_posts_user_id_timestamp", "user_id", "timestamp"),
+    )
+
 
 class PostLike(Base):
     __tablename__ = "post_likes"
@@ -107,4 +120,76 @@ class ForumReply(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     post = relationship("ForumPost", back_populates="replies")
-    user = relationship("User", back_populates="forum_replies")
\ No newline at end of file
+    user = relationship("User", back_populates="forum_replies")
+
+    __table_args__ = (Index("ix_forum_replies_post_id_timestamp", "post_id", "timestamp"),)
+
+
+class IdBlock(Base):
+    """Next free id per table for ids handed out ahead of their insert (see id_allocator.py)."""
+    __tablename__ = "id_blocks"
+    name = Column(String(50), primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+
+class ScanWriteFailure(Base):
+    """A scan whose id was returned to the client but whose write failed (see scan_writer.py)."""
+    __tablename__ = "scan_write_failures"
+    scan_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    error = Column(Text, nullable=False)
+    failed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserStats(Base):
+    """Profile counters kept up to date by the endpoints that change them (see user_stats.py)."""
+    __tablename__ = "user_stats"
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    posts_count = Column(Integer, nullable=False, default=0)
+    total_likes_received = Column(Integer, nullable=False, default=0)
+    scans_count = Column(Integer, nullable=False, default=0)
+
+
+class ScanJob(Base):
+    """A bulk prediction job, worked off in the background by scan_jobs.JobRunner."""
+    __tablename__ = "scan_jobs"
+    job_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")   # queued, running, done, cancelled
+    total = Column(Integer, nullable=False)
+    processed = Column(Integer, nullable=False, default=0)   # images done or failed
+    failed = Column(Integer, nullable=False, default=0)
+    topk_species = Column(Integer, nullable=False, default=1)
+    topk_disease = Column(Integer, nullable=False, default=4)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    items = relationship("ScanJobItem", back_populates="job", cascade="all, delete-orphan")
+
+
+class ScanJobItem(Base):
+    """One image of a scan job, with its predictions and scan once processed."""
+    __tablename__ = "scan_job_items"
+    item_id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("scan_jobs.job_id"), nullable=False)
+    position = Column(Integer, nullable=False)   # order of the image in the upload
+    filename = Column(String(255))
+    image_path = Column(String(255), nullable=False)
+    content_hash = Column(String(64))
+    status = Column(String(20), nullable=False, default="pending")   # pending, running, done, failed, cancelled
+    worker = Column(String(32))       # claim token of the worker processing it
+    claimed_at = Column(DateTime)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")   # claims so far
+    scan_id = Column(Integer, ForeignKey("scans.scan_id"))
+    result = Column(Text)             # JSON species/disease predictions
+    error = Column(Text)
+
+    job = relationship("ScanJob", back_populates="items")
+
+    __table_args__ = (
+        # results pages, and the pending/running items of a job
+        UniqueConstraint("job_id", "position", name="uq_scan_job_item_position"),
+        Index("ix_scan_job_items_job_id_status", "job_id", "status"),
+        # the work queue, oldest first
+        Index("ix_scan_job_items_status_item_id", "status", "item_id"),
+    )
@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+
+
+class PredictionCache:
+    """
+    Softmax outputs of both models per image, keyed by a hash of the raw
+    image bytes and the model version, so a re-uploaded photo skips inference.
+
+    An in-process LRU bounded by `max_entries` and `ttl_seconds`, optionally
+    backed by a SQLite file that survives restarts and is shared by workers.
+    """
+
+    def __init__(self, model_version, max_entries=1024, ttl_seconds=86400, persistent_path=None,
+                 prune_every=1000):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.prune_every = prune_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+        # the SQLite tier is file I/O: it runs in the threadpool, one statement at a time
+        self.persistent_path = persistent_path or None
+        self._db = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self.persistent_path is not None
+
+    def _connection(self):
+        """
+        This process's connection to the SQLite tier, opened on first use: one
+        opened before a fork (gunicorn --preload imports the app in the master)
+        must not be shared with the forked workers. Call with _db_lock held.
+        """
+        if self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.persistent_path, check_same_thread=False)
+            self._db_pid = os.getpid()
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, created_at REAL NOT NULL, species BLOB NOT NULL, disease BLOB NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None and self._db_pid == os.getpid():
+                self._db.close()
+            self._db = self._db_pid = None
+
+    def key(self, digest):
+        """Cache key for an image given the SHA-256 hex digest of its raw bytes."""
+        return f"{self.model_version}:{digest}"
+
+    async def get(self, key):
+        """(species_probs, disease_probs) for a cached image, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, species, disease = entry
+                if now - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.CACHE_LOOKUPS.labels("hit").inc()
+                    return species, disease
+                del self._entries[key]
+
+        if self.persistent_path is not None:
+            row = await run_in_threadpool(self._read, key)
+            if row is not None and now - row[0] <= self.ttl:
+                species = torch.from_numpy(np.frombuffer(row[1], dtype=np.float32).copy())
+                disease = torch.from_numpy(np.frombuffer(row[2], dtype=np.float32).copy())
+                with self._lock:
+                    self._remember(key, row[0], species, disease)
+                    self.persistent_hits += 1
+                metrics.CACHE_LOOKUPS.labels("persistent_hit").inc()
+                return species, disease
+
+        with self._lock:
+            self.misses += 1
+        metrics.CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    async def put(self, key, species_probs, disease_probs):
+        # clone so the entry doesn't keep the whole batch output alive
+        species = species_probs.detach().to(torch.float32).cpu().clone()
+        disease = disease_probs.detach().to(torch.float32).cpu().clone()
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, species, disease)
+        if self.persistent_path is not None:
+            await run_in_threadpool(self._write, key, now, species.numpy().tobytes(), disease.numpy().tobytes())
+
+    def _remember(self, key, created_at, species, disease):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (created_at, species, disease)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read(self, key):
+        with self._db_lock:
+            return self._connection().execute(
+                "SELECT created_at, species, disease FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _write(self, key, created_at, species, disease):
+        with self._db_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO predictions (key, created_at, species, disease) VALUES (?, ?, ?, ?)",
+                (key, created_at, species, disease),
+            )
+            db.commit()
+            self._writes += 1
+            prune = self.prune_every > 0 and self._writes % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired rows from the persistent tier; runs every `prune_every` writes."""
+        if self.persistent_path is not None:
+            with self._db_lock:
+                db = self._connection()
+                db.execute("DELETE FROM predictions WHERE created_at < ?", (time.time() - self.ttl,))
+                db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "persistent": self.persistent_path is not None,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+        }
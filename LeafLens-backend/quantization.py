@@ -0,0 +1,67 @@
+import copy
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+
+ENGINES = ("fp32", "dynamic", "static")
+
+
+def select_backend():
+    """Pick the quantized kernel backend for this CPU (x86/fbgemm on Intel/AMD, qnnpack on ARM)."""
+    supported = torch.backends.quantized.supported_engines
+    for backend in ("x86", "fbgemm", "qnnpack"):
+        if backend in supported:
+            torch.backends.quantized.engine = backend
+            return backend
+    raise RuntimeError("This torch build has no quantized CPU backend")
+
+
+def quantize_linear_dynamic(model):
+    """INT8 weights for the Linear layers (the classifier heads), activations quantized on the fly."""
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_batches):
+    """FX graph mode post-training quantization of the whole network, convolutions included."""
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    backend = select_backend()
+    example = next(iter(calibration_batches))
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(backend), (example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def calibration_set(root, n_batches=10, batch_size=32, num_workers=0):
+    """
+    First `n_batches` image batches of the PlantNet validation split, normalized
+    like the serving transform. Labels are dropped, calibration only needs inputs.
+    """
+    # the training utilities pull in timm and the dataset code, keep them off the serving path
+    from utils import get_data
+
+    _, valloader, _, _ = get_data(root, image_size=224, crop_size=224, batch_size=batch_size,
+                                  num_workers=num_workers, pretrained=True)
+    batches = []
+    for x, _ in valloader:
+        batches.append(x)
+        if len(batches) >= n_batches:
+            break
+    return batches
+
+
+def apply_engine(model, engine, calibration_batches=None):
+    """Return `model` converted for the requested inference engine."""
+    if engine == "fp32":
+        return model
+    if engine == "dynamic":
+        select_backend()
+        return quantize_linear_dynamic(model)
+    if engine == "static":
+        if not calibration_batches:
+            raise RuntimeError("Static quantization needs a calibration set (set LEAFLENS_CALIBRATION_ROOT)")
+        return quantize_static(model, calibration_batches)
+    raise ValueError(f"Unknown inference engine: {engine}")
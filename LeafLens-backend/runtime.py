@@ -0,0 +1,83 @@
+import os
+
+import torch
+import torch.nn as nn
+
+# Exported artifacts hold one module computing both classifiers, so a single
+# call returns (species_logits, disease_logits) whichever backend serves it.
+TORCHSCRIPT_FILE = "leaflens_classifiers.torchscript.pt"
+ONNX_FILE = "leaflens_classifiers.onnx"
+
+RUNTIMES = ("eager", "torchscript", "onnx")
+
+
+class Classifiers(nn.Module):
+    """Both classifiers behind one forward, as traced by export_models.py."""
+
+    def __init__(self, species_model, disease_model, fused_model=None):
+        super().__init__()
+        self.fused_model = fused_model
+        if fused_model is None:
+            self.species_model = species_model
+            self.disease_model = disease_model
+
+    def forward(self, x):
+        if self.fused_model is not None:
+            return self.fused_model(x)
+        return self.species_model(x), self.disease_model(x)
+
+
+class EagerRuntime:
+    """Serves the Python-built models directly."""
+
+    name = "eager"
+
+    def __init__(self, classifiers, device):
+        self.classifiers = classifiers
+        self.device = device
+
+    def __call__(self, batch):
+        return self.classifiers(batch.to(self.device))
+
+
+class TorchScriptRuntime:
+    """Serves the frozen TorchScript artifact, optimized for inference on this machine."""
+
+    name = "torchscript"
+
+    def __init__(self, export_dir, device):
+        self.path = os.path.join(export_dir, TORCHSCRIPT_FILE)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"{self.path} not found, run export_models.py first")
+        self.device = device
+        self.module = torch.jit.optimize_for_inference(torch.jit.load(self.path, map_location=device))
+
+    def __call__(self, batch):
+        return self.module(batch.to(self.device))
+
+
+class OnnxRuntime:
+    """Serves the ONNX artifact through ONNX Runtime on CPU."""
+
+    name = "onnx"
+
+    def __init__(self, export_dir, threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("LEAFLENS_RUNTIME=onnx needs the onnxruntime package (pip install onnxruntime)")
+
+        self.path = os.path.join(export_dir, ONNX_FILE)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"{self.path} not found, run export_models.py first")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        species, disease = self.session.run(None, {self.input_name: batch.cpu().numpy()})
+        return torch.from_numpy(species), torch.from_numpy(disease)
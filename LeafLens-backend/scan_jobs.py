@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+import torch
+from fastapi import HTTPException
+from sqlalchemy import and_, exists, update
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+import models
+import user_stats
+from preprocessing import INPUT_SIZE
+
+logger = logging.getLogger(__name__)
+
+Item = models.ScanJobItem
+
+# jobs whose images may still be claimed; done and cancelled jobs take no more work
+ACTIVE = ("queued", "running")
+
+
+def create_job(db, user_id, images, topk_species=1, topk_disease=4):
+    """Queue a job for already stored images, given as (filename, image_path, content_hash)."""
+    job = models.ScanJob(
+        user_id=user_id, status="queued", total=len(images), processed=0, failed=0,
+        topk_species=topk_species, topk_disease=topk_disease,
+    )
+    job.items = [
+        Item(position=position, filename=filename, image_path=image_path, content_hash=content_hash, status="pending")
+        for position, (filename, image_path, content_hash) in enumerate(images)
+    ]
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def referenced_hashes(db, digests):
+    """The content hashes among `digests` that a scan image or a scan job item still to be processed points to."""
+    if not digests:
+        return set()
+    images = db.query(models.ScanImage.content_hash).filter(models.ScanImage.content_hash.in_(digests))
+    items = db.query(Item.content_hash).filter(
+        Item.content_hash.in_(digests), Item.status.in_(("pending", "running"))
+    )
+    return {content_hash for query in (images, items) for content_hash, in query.distinct()}
+
+
+async def delete_unreferenced(db, storage, images):
+    """
+    Delete the blobs of `images` ({content_hash: image_path}) that no scan
+    and no scan job item still to be processed points to.
+    """
+    if not images:
+        return
+    try:
+        referenced = await run_in_threadpool(referenced_hashes, db, set(images))
+        for digest, image_path in images.items():
+            if digest not in referenced:
+                await storage.delete(image_path)
+    except Exception:
+        logger.exception("Deleting the images of unprocessed scan job items failed")
+
+
+def item_images(db, *criteria):
+    """{content_hash: image_path} of the scan job items matching `criteria`."""
+    return {
+        content_hash: image_path
+        for content_hash, image_path in db.query(Item.content_hash, Item.image_path).filter(*criteria)
+        if content_hash
+    }
+
+
+def get_job(db, job_id):
+    job = db.get(models.ScanJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job
+
+
+def job_status(job):
+    return {
+        "job_id": job.job_id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "failed": job.failed,
+        "progress": round(job.processed / job.total, 4) if job.total else 1.0,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def cancel_job(db, job):
+    """
+    Stop a job: its pending images are dropped, images already being
+    processed still finish. Returns the job and the {content_hash: image_path}
+    of the dropped images, for delete_unreferenced.
+    """
+    if job.status in ("done", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Scan job is already {job.status}")
+    pending = and_(Item.job_id == job.job_id, Item.status == "pending")
+    dropped = item_images(db, pending)
+    db.execute(update(Item).where(pending).values(status="cancelled"))
+    job.status = "cancelled"
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    db.refresh(job)
+    return job, dropped
+
+
+def results_page(db, job_id, limit=50, cursor=None):
+    """
+    One page of a job's images in upload order, with the predictions and
+    scan of each processed one. `cursor` is the position of the last image
+    of the previous page. Returns the items and the next cursor, or None.
+    """
+    query = db.query(Item).filter(Item.job_id == job_id)
+    if cursor is not None:
+        query = query.filter(Item.position > cursor)
+    rows = query.order_by(Item.position).limit(limit + 1).all()
+
+    items = []
+    for item in rows[:limit]:
+        entry = {"position": item.position, "filename": item.filename, "status": item.status}
+        if item.status == "done":
+            entry["scan_id"] = item.scan_id
+            entry.update(json.loads(item.result))
+        elif item.status == "failed":
+            entry["error"] = item.error
+        items.append(entry)
+    next_cursor = str(rows[limit - 1].position) if len(rows) > limit else None
+    return items, next_cursor
+
+
+def finish_if_complete(db, job_id):
+    """Mark a running job done once none of its images are left pending or running."""
+    remaining = db.query(Item.item_id).filter(
+        Item.job_id == job_id, Item.status.in_(("pending", "running"))
+    ).first()
+    if remaining is None:
+        db.execute(
+            update(models.ScanJob)
+            .where(models.ScanJob.job_id == job_id, models.ScanJob.status == "running")
+            .values(status="done", finished_at=datetime.utcnow())
+        )
+
+
+class JobRunner:
+    """
+    Background workers for scan jobs. The queue is the scan_job_items table:
+    each worker claims up to `batch_size` pending images of the oldest job,
+    runs them through the models as one batch and, in one transaction per
+    batch, writes their scans and results and advances the job's progress.
+
+    A claim is a lease: images whose worker died (crash, restart, deploy)
+    are claimed again once `lease_seconds` have passed, so unfinished jobs
+    resume by themselves. Images claimed `max_attempts` times without being
+    finished (a batch that keeps failing) are marked failed instead, and
+    those of a job cancelled meanwhile cancelled. The blobs of failed and
+    cancelled images are deleted unless something else uses them. Several
+    processes can share the same database.
+    """
+
+    def __init__(self, session_factory, storage, preprocess, run_batch, labels, scan_ids,
+                 workers=2, batch_size=32, poll_seconds=2.0, lease_seconds=120, max_attempts=3,
+                 input_size=INPUT_SIZE):
+        self.session_factory = session_factory
+        self.storage = storage
+        self.preprocess = preprocess      # async: (image bytes, out=[3, H, W] row) -> the row, filled
+        self.run_batch = run_batch        # async: [N, 3, H, W] -> (species_probs, disease_probs)
+        self.labels = labels
+        self.scan_ids = scan_ids
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.input_size = input_size
+        self._wake = None
+        self._tasks = []
+        self._stopping = False
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Let the workers finish their current batch, then stop; the rest waits for the next start."""
+        self._stopping = True
+        if self._wake:
+            self._wake.set()
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+
+    def wake(self):
+        """Start on newly queued work now instead of at the next poll."""
+        if self._wake:
+            self._wake.set()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await self._delete_unreferenced(await run_in_threadpool(self._reap))
+                claim = await run_in_threadpool(self._claim)
+            except Exception:
+                logger.exception("Claiming scan job images failed")
+                claim = None
+            if claim is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._process(*claim)
+            except Exception:
+                # left claimed, so they are retried once the lease runs out
+                logger.exception("Processing a scan job batch failed")
+
+    def _expired(self):
+        """Images whose lease ran out without their batch being finished."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        return and_(Item.status == "running", Item.claimed_at < cutoff)
+
+    def _reap(self):
+        """
+        Settle the images whose lease ran out but that can't be claimed again:
+        those of jobs no longer active are cancelled, those on their last
+        attempt failed. Returns their {content_hash: image_path}.
+        """
+        db = self.session_factory()
+        try:
+            expired = self._expired()
+            stopped = [item_id for item_id, in db.query(Item.item_id).join(models.ScanJob).filter(
+                expired, models.ScanJob.status.notin_(ACTIVE)
+            )]
+            released = item_images(db, Item.item_id.in_(stopped)) if stopped else {}
+            if stopped:
+                db.execute(
+                    update(Item).where(Item.item_id.in_(stopped), expired)
+                    .values(status="cancelled")
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+            released.update(self._give_up(db, and_(expired, Item.attempts >= self.max_attempts)))
+            return released
+        finally:
+            db.close()
+
+    def _claim(self):
+        """Lease the next images of the oldest active job with work left: (token, job, items) or None."""
+        token = uuid.uuid4().hex
+        now = datetime.utcnow()
+        expired = and_(self._expired(), Item.attempts < self.max_attempts)
+        db = self.session_factory()
+        try:
+            for claimable in (Item.status == "pending", expired):
+                job_id = db.query(Item.job_id).join(models.ScanJob).filter(
+                    claimable, models.ScanJob.status.in_(ACTIVE)
+                ).order_by(Item.item_id).limit(1).scalar()
+                if job_id is not None:
+                    break
+            else:
+                return None
+
+            # a single UPDATE, so two workers never lease the same image,
+            # and none of a job cancelled since it was picked
+            ids = (
+                db.query(Item.item_id).filter(Item.job_id == job_id, claimable)
+                .order_by(Item.position).limit(self.batch_size).scalar_subquery()
+            )
+            active = exists().where(models.ScanJob.job_id == job_id, models.ScanJob.status.in_(ACTIVE))
+            db.execute(
+                update(Item).where(Item.item_id.in_(ids), claimable, active)
+                .values(status="running", worker=token, claimed_at=now, attempts=Item.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.execute(
+                update(models.ScanJob).where(models.ScanJob.job_id == job_id, models.ScanJob.status == "queued")
+                .values(status="running")
+            )
+            db.commit()
+
+            job = db.get(models.ScanJob, job_id)
+            items = db.query(Item).filter(
+                Item.job_id == job_id, Item.status == "running", Item.worker == token
+            ).order_by(Item.position).all()
+            db.expunge_all()
+            return (token, job, items) if items else None
+        finally:
+            db.close()
+
+    def _give_up(self, db, exhausted):
+        """
+        Mark failed the images matching `exhausted`, leases that ran out on
+        their last attempt. Returns their {content_hash: image_path}.
+        """
+        released = {}
+        job_ids = [job_id for job_id, in db.query(Item.job_id).filter(exhausted).distinct()]
+        for job_id in job_ids:
+            released.update(item_images(db, Item.job_id == job_id, exhausted))
+            gave_up = db.execute(
+                update(Item).where(Item.job_id == job_id, exhausted)
+                .values(status="failed", error=f"Gave up after {self.max_attempts} attempts")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if gave_up:
+                logger.warning("Gave up on %d images of scan job %d", gave_up, job_id)
+                db.execute(
+                    update(models.ScanJob).where(models.ScanJob.job_id == job_id).values(
+                        processed=models.ScanJob.processed + gave_up,
+                        failed=models.ScanJob.failed + gave_up,
+                    )
+                )
+                finish_if_complete(db, job_id)
+        if job_ids:
+            db.commit()
+        return released
+
+    async def _process(self, token, job, items):
+        failed = {}
+        ok = []
+        # decoded straight into the batch's rows; images that fail leave no gap
+        batch = torch.empty((len(items), 3, self.input_size, self.input_size))
+        for item in items:
+            try:
+                source = await self.storage.read(item.image_path)
+                await self.preprocess(source, out=batch[len(ok)])
+                ok.append(item)
+            except Exception as e:
+                failed[item.item_id] = f"Could not read image: {e}"
+
+        done = []
+        if ok:
+            species_probs, disease_probs = await self.run_batch(batch[:len(ok)])
+            per_image, _ = self.labels.predict(species_probs, disease_probs, job.topk_species, job.topk_disease)
+            done = list(zip(ok, per_image))
+
+        released = await run_in_threadpool(self._finish, token, job, done, failed)
+        await self._delete_unreferenced(released)
+
+    async def _delete_unreferenced(self, images):
+        if images:
+            with self.session_factory() as db:
+                await delete_unreferenced(db, self.storage, images)
+
+    def _finish(self, token, job, done, failed):
+        """Write the scans and results of a batch and advance the job, in one transaction."""
+        db = self.session_factory()
+        try:
+            # images whose lease ran out and went to another worker are left to it
+            ours = {item_id for item_id, in db.query(Item.item_id).filter(
+                Item.job_id == job.job_id, Item.status == "running", Item.worker == token
+            )}
+            done = [(item, prediction) for item, prediction in done if item.item_id in ours]
+            failed = {item_id: error for item_id, error in failed.items() if item_id in ours}
+
+            missing = self.labels.unresolved([prediction for _, prediction in done])
+            if missing:
+                self.labels.refresh_disease_ids(db, missing)
+
+            scan_ids = self.scan_ids.next_ids(len(done)) if done else []
+            for (item, prediction), scan_id in zip(done, scan_ids):
+                db.add(models.Scan(
+                    scan_id=scan_id,
+                    user_id=job.user_id,
+                    disease_id=prediction.disease_id,
+                    confidence_score=prediction.confidence,
+                ))
+                db.add(models.ScanImage(scan_id=scan_id, image_path=item.image_path, content_hash=item.content_hash))
+                db.execute(
+                    update(Item).where(Item.item_id == item.item_id)
+                    .values(status="done", scan_id=scan_id, result=json.dumps(prediction.as_dict()))
+                )
+            for item_id, error in failed.items():
+                db.execute(update(Item).where(Item.item_id == item_id).values(status="failed", error=error))
+            if done:
+                user_stats.bump(db, job.user_id, scans_count=len(done))
+
+            db.execute(
+                update(models.ScanJob).where(models.ScanJob.job_id == job.job_id).values(
+                    processed=models.ScanJob.processed + len(done) + len(failed),
+                    failed=models.ScanJob.failed + len(failed),
+                )
+            )
+            finish_if_complete(db, job.job_id)
+            released = item_images(db, Item.item_id.in_(list(failed))) if failed else {}
+            with metrics.timed("db_commit"):
+                db.commit()
+            return released
+        finally:
+            db.close()
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+import models
+import user_stats
+
+logger = logging.getLogger(__name__)
+
+
+class PendingScan:
+    """A prediction result waiting to be written as a Scan row plus its ScanImage rows."""
+
+    def __init__(self, scan_id, user_id, disease_id, confidence_score, images=(), plant_id=None):
+        self.scan_id = scan_id
+        self.user_id = user_id
+        self.disease_id = disease_id
+        self.confidence_score = confidence_score
+        self.images = list(images)            # storage.StagedBlob, committed on write
+        self.plant_id = plant_id
+
+
+class ScanWriter:
+    """
+    Write-behind stage for prediction results. The endpoint responds as soon
+    as predictions are ready; this worker saves the images and inserts the
+    Scan and ScanImage rows of many requests in one transaction, gathering
+    up to `max_batch` scans or waiting at most `max_delay_ms` for more.
+    Scan ids are allocated up front, so clients get them immediately.
+
+    If the shared transaction fails, each request's scans are retried in a
+    transaction of their own, so one bad row only fails its own request.
+    Images stored for scans that end up not written are deleted again, and
+    the failures recorded in scan_write_failures. Pending scans are only
+    known to the process that holds them.
+    """
+
+    max_failed = 1000
+
+    def __init__(self, session_factory, storage, max_batch=64, max_delay_ms=50):
+        self.session_factory = session_factory
+        self.storage = storage
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.pending = {}
+        self.failed = {}
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write everything still queued, then stop."""
+        if self._worker:
+            await self._queue.put(None)
+            await self._worker
+            self._worker = None
+
+    def submit(self, scan):
+        self.submit_all([scan])
+
+    def submit_all(self, scans):
+        """Queue scans that are always written together, in the same transaction."""
+        for scan in scans:
+            self.pending[scan.scan_id] = scan
+        self._queue.put_nowait(list(scans))
+
+    def status(self, scan_id):
+        if scan_id in self.pending:
+            return "pending"
+        if scan_id in self.failed:
+            return "failed"
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while sum(len(unit) for unit in batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    scans = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if scans is None:
+                    stopping = True
+                    break
+                batch.append(scans)
+            await self._write(batch)
+
+    async def _write(self, units):
+        """Write a batch of submit_all units: all in one transaction, or each on its own if that fails."""
+        scans = [scan for unit in units for scan in unit]
+        committed = {}      # digest -> image_path of the blobs stored by this write
+        written = []
+        try:
+            digests = {image.digest for scan in scans for image in scan.images}
+            paths = await run_in_threadpool(self._stored_paths, digests)
+            for scan in scans:
+                for image in scan.images:
+                    if image.digest in paths:
+                        await self.storage.discard(image)
+                    else:
+                        paths[image.digest] = committed[image.digest] = await self.storage.commit(image)
+            try:
+                await run_in_threadpool(self._insert, scans, paths)
+                written = units
+            except Exception:
+                if len(units) == 1:
+                    raise
+                logger.warning("Writing %d scans together failed, retrying each request on its own", len(scans))
+                for unit in units:
+                    try:
+                        await run_in_threadpool(self._insert, unit, paths)
+                        written.append(unit)
+                    except Exception as e:
+                        logger.exception("Writing %d scans failed", len(unit))
+                        await self._fail(unit, e)
+        except Exception as e:
+            logger.exception("Writing %d scans failed", len(scans))
+            for unit in units:
+                if unit not in written:
+                    await self._fail(unit, e)
+        finally:
+            for scan in scans:
+                self.pending.pop(scan.scan_id, None)
+
+        if committed and len(written) < len(units):
+            await self._delete_unreferenced(committed)
+
+    async def _fail(self, unit, error):
+        for scan in unit:
+            for image in scan.images:
+                await self.storage.discard(image)
+            self.failed[scan.scan_id] = str(error)
+        while len(self.failed) > self.max_failed:
+            self.failed.pop(next(iter(self.failed)))
+        try:
+            await run_in_threadpool(self._record_failures, unit, str(error))
+        except Exception:
+            # the database may be what failed; this process still knows
+            logger.exception("Recording %d failed scans failed", len(unit))
+
+    def _record_failures(self, unit, error):
+        """Keep the failure where every worker, and this one after a restart, can report it."""
+        db = self.session_factory()
+        try:
+            for scan in unit:
+                db.merge(models.ScanWriteFailure(scan_id=scan.scan_id, user_id=scan.user_id, error=error))
+            db.commit()
+        finally:
+            db.close()
+
+    async def _delete_unreferenced(self, committed):
+        """Delete blobs stored by a write that no ScanImage row points to, as no scan that used them was written."""
+        try:
+            referenced = await run_in_threadpool(self._stored_paths, set(committed))
+            for digest, image_path in committed.items():
+                if digest not in referenced:
+                    await self.storage.delete(image_path)
+        except Exception:
+            logger.exception("Deleting the images of failed scans failed")
+
+    def _stored_paths(self, digests):
+        """image_path of images already stored, by content hash, so duplicates aren't written again."""
+        if not digests:
+            return {}
+        db = self.session_factory()
+        try:
+            rows = db.query(models.ScanImage.content_hash, models.ScanImage.image_path).filter(
+                models.ScanImage.content_hash.in_(digests)
+            ).all()
+            return {content_hash: image_path for content_hash, image_path in rows}
+        finally:
+            db.close()
+
+    def _insert(self, batch, paths):
+        db = self.session_factory()
+        try:
+            db.add_all([
+                models.Scan(
+                    scan_id=scan.scan_id,
+                    user_id=scan.user_id,
+                    plant_id=scan.plant_id,
+                    disease_id=scan.disease_id,
+                    confidence_score=scan.confidence_score,
+                )
+                for scan in batch
+            ])
+            scans_per_user = {}
+            for scan in batch:
+                scans_per_user[scan.user_id] = scans_per_user.get(scan.user_id, 0) + 1
+            for user_id, count in scans_per_user.items():
+                user_stats.bump(db, user_id, scans_count=count)
+            db.add_all([
+                models.ScanImage(scan_id=scan.scan_id, image_path=paths[image.digest], content_hash=image.digest)
+                for scan in batch
+                for image in scan.images
+            ])
+            with metrics.timed("db_commit"):
+                db.commit()
+        finally:
+            db.close()
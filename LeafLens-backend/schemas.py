@@ -74,6 +74,7 @@ class ScanImageCreate(ScanImageBase):
 
 class ScanImageResponse(ScanImageBase):
     image_id: int
+    content_hash: Optional[str] = None
     uploaded_at: datetime
 
     class Config:
@@ -110,6 +111,9 @@ class ForumPostResponse(ForumPostBase):
     class Config:
         orm_mode = True
 
+class ForumSearchResult(ForumPostResponse):
+    rank: float  # bm25, lower is a better match
+
 
 
 class ForumReplyBase(BaseModel):
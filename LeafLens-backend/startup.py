@@ -0,0 +1,83 @@
+import os
+import time
+from contextlib import contextmanager
+
+# import this module before anything heavy, so the import phase is measured from here
+IMPORTED_AT = time.perf_counter()
+
+
+class StartupReport:
+    """
+    Startup state and timings of the API process. The server answers
+    liveness checks as soon as it runs; the models load and warm up in the
+    background, and readiness turns green once they can serve predictions.
+    """
+
+    def __init__(self, started=IMPORTED_AT):
+        self.started = started
+        self.state = "starting"       # starting, ready, failed
+        self.error = None
+        self.phases = {}              # name -> seconds, in the order they finished
+        self.details = {}
+        self.ready_after = None
+        self._last_mark = started
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def mark(self, name):
+        """Record the time since the previous mark (or the start) as phase `name`."""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last_mark
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def set_ready(self):
+        self.state = "ready"
+        self.ready_after = time.perf_counter() - self.started
+
+    def set_failed(self, error):
+        self.state = "failed"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def as_dict(self):
+        return {
+            "state": self.state,
+            "error": self.error,
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "uptime_seconds": round(time.perf_counter() - self.started, 3),
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            **self.details,
+        }
+
+
+def process_memory():
+    """
+    Memory of this process in MB, from /proc (Linux only, None elsewhere):
+    rss in total, split into anonymous (private heap) and file-backed pages
+    (memory-mapped weights, shared with every process mapping the same
+    file), and pss, which divides shared pages among the processes using them.
+    """
+    fields = {"VmRSS": "rss_mb", "RssAnon": "rss_anon_mb", "RssFile": "rss_file_mb", "RssShmem": "rss_shmem_mb"}
+    usage = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    usage[fields[name]] = round(int(value.split()[0]) / 1024, 1)
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    usage["pss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return usage
@@ -0,0 +1,181 @@
+import abc
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+
+import aiofiles
+import aiofiles.os
+from starlette.concurrency import run_in_threadpool
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".bmp"}
+
+
+class StagedBlob:
+    """An upload written to a temp file and hashed, waiting to be committed or discarded."""
+
+    def __init__(self, digest, size, temp_path, suffix):
+        self.digest = digest
+        self.size = size
+        self.temp_path = temp_path
+        self.suffix = suffix
+
+
+def blob_suffix(filename):
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return suffix if suffix in IMAGE_SUFFIXES else ""
+
+
+def blob_key(digest, suffix=""):
+    """Sharded content-addressed layout: ab/cd/abcd...ef.jpg"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+
+class BlobStorage(abc.ABC):
+    """
+    Content-addressed image storage. Uploads are streamed to a temp file in
+    chunks while being hashed (stage), then either moved to their final
+    content-addressed location (commit) or dropped as duplicates (discard).
+    """
+
+    chunk_bytes = 1024 * 1024
+
+    def __init__(self, staging_dir=None):
+        self.staging_dir = staging_dir
+
+    async def _staging_path(self):
+        if self.staging_dir:
+            await aiofiles.os.makedirs(self.staging_dir, exist_ok=True)
+        return os.path.join(self.staging_dir or tempfile.gettempdir(), f"staged-{uuid.uuid4().hex}")
+
+    async def stage(self, file, max_bytes=None):
+        temp_path = await self._staging_path()
+
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(temp_path, "wb") as out:
+                while True:
+                    chunk = await file.read(self.chunk_bytes)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise ValueError(f"{file.filename} is larger than {max_bytes} bytes")
+                    hasher.update(chunk)
+                    await out.write(chunk)
+        except BaseException:
+            await self._remove(temp_path)
+            raise
+
+        return StagedBlob(hasher.hexdigest(), size, temp_path, blob_suffix(file.filename))
+
+    async def adopt(self, upload):
+        """Stage an already hashed ingest.IngestedImage, copying out its spooled file or bytes."""
+        temp_path = await self._staging_path()
+        source = upload.open()
+        try:
+            if isinstance(source, (bytes, bytearray)):
+                async with aiofiles.open(temp_path, "wb") as out:
+                    await out.write(source)
+            else:
+                await run_in_threadpool(self._copy, source, temp_path)
+        except BaseException:
+            await self._remove(temp_path)
+            raise
+        return StagedBlob(upload.digest, upload.size, temp_path, blob_suffix(upload.filename))
+
+    def _copy(self, source, temp_path):
+        with open(temp_path, "wb") as out:
+            shutil.copyfileobj(source, out, self.chunk_bytes)
+
+    async def discard(self, staged):
+        await self._remove(staged.temp_path)
+
+    @abc.abstractmethod
+    async def commit(self, staged):
+        """Store a staged blob under its content address and return its image_path."""
+
+    @abc.abstractmethod
+    async def delete(self, image_path):
+        """Delete a committed blob."""
+
+    @abc.abstractmethod
+    async def read(self, image_path):
+        """Bytes of a committed blob."""
+
+    @staticmethod
+    async def _remove(path):
+        try:
+            await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalBlobStorage(BlobStorage):
+    """Blobs under a local directory, e.g. uploads/ab/cd/<sha256>.jpg, served by the /uploads mount."""
+
+    def __init__(self, root):
+        # staging next to the root keeps the final move a same-filesystem rename,
+        # and out of the served tree so uncommitted uploads are never public
+        super().__init__(staging_dir=os.path.normpath(root) + ".staging")
+        self.root = root
+
+    async def commit(self, staged):
+        path = os.path.join(self.root, blob_key(staged.digest, staged.suffix))
+        if await aiofiles.os.path.exists(path):
+            await self.discard(staged)
+        else:
+            await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+            await aiofiles.os.replace(staged.temp_path, path)
+        return path
+
+    async def delete(self, image_path):
+        await self._remove(image_path)
+
+    async def read(self, image_path):
+        async with aiofiles.open(image_path, "rb") as f:
+            return await f.read()
+
+
+class S3BlobStorage(BlobStorage):
+    """Blobs in an S3-compatible bucket, e.g. a local MinIO container during development."""
+
+    def __init__(self, bucket, endpoint_url=None, public_url=None):
+        super().__init__()
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("LEAFLENS_STORAGE=s3 needs the boto3 package (pip install boto3)")
+
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.public_url = (public_url or f"{endpoint_url or 'https://s3.amazonaws.com'}/{bucket}").rstrip("/")
+
+    async def commit(self, staged):
+        key = blob_key(staged.digest, staged.suffix)
+        try:
+            await run_in_threadpool(self.client.upload_file, staged.temp_path, self.bucket, key)
+        finally:
+            await self.discard(staged)
+        return f"{self.public_url}/{key}"
+
+    async def delete(self, image_path):
+        key = image_path[len(self.public_url) + 1:]
+        await run_in_threadpool(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def read(self, image_path):
+        key = image_path[len(self.public_url) + 1:]
+        response = await run_in_threadpool(self.client.get_object, Bucket=self.bucket, Key=key)
+        return await run_in_threadpool(response["Body"].read)
+
+
+def create_storage(backend, local_root, s3_bucket=None, s3_endpoint_url=None, s3_public_url=None):
+    if backend == "local":
+        return LocalBlobStorage(local_root)
+    if backend == "s3":
+        if not s3_bucket:
+            raise RuntimeError("LEAFLENS_STORAGE=s3 needs LEAFLENS_S3_BUCKET")
+        return S3BlobStorage(s3_bucket, endpoint_url=s3_endpoint_url, public_url=s3_public_url)
+    raise ValueError(f"Unknown storage backend: {backend}")
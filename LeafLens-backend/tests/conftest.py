@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# the backend is a set of flat modules run from its own directory
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# config.py reads these on first import: keep the app module's database,
+# uploads and prediction cache away from the checked-in ones
+APP_DIR = tempfile.mkdtemp(prefix="leaflens-tests-")
+os.environ["LEAFLENS_DATABASE_URL"] = f"sqlite:///{os.path.join(APP_DIR, 'app.db')}"
+os.environ["LEAFLENS_UPLOAD_DIR"] = os.path.join(APP_DIR, "uploads")
+os.environ["LEAFLENS_PREDICTION_CACHE_SIZE"] = "0"
+
+import ingest  # noqa: E402
+import migrate  # noqa: E402
+import models  # noqa: E402
+from storage import LocalBlobStorage  # noqa: E402
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a fresh SQLite database at migration head."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    migrate.upgrade(engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalBlobStorage(str(tmp_path / "uploads"))
+
+
+def add_user(db, user_id=1):
+    db.add(models.User(
+        user_id=user_id, name=f"user{user_id}", email=f"user{user_id}@example.com",
+        password_hash="x", user_type="farmer",
+    ))
+    db.commit()
+    return user_id
+
+
+def stored_files(storage):
+    """Relative paths of every file under the storage root and its staging directory."""
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), os.path.dirname(storage.root))
+        for top in (storage.root, storage.staging_dir)
+        for directory, _, names in os.walk(top)
+        for name in names
+    )
+
+
+def stage(storage, data, filename="leaf.jpg"):
+    """A StagedBlob of `data`, as the prediction endpoints stage uploads."""
+    upload = ingest.IngestedImage(hashlib.sha256(data).hexdigest(), len(data), data, filename)
+    return asyncio.run(storage.adopt(upload))
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+import torch
+
+from batching import MicroBatcher
+
+
+def run_with_batcher(scenario, max_batch_size=4, fail=False):
+    """Run `scenario(batcher)` against a batcher whose model doubles its input; returns (result, batch sizes)."""
+    sizes = []
+
+    async def run_batch(batch):
+        sizes.append(batch.size(0))
+        await asyncio.sleep(0.01)
+        if fail:
+            raise RuntimeError("model failed")
+        return batch * 2, batch.sum(dim=1)
+
+    async def main():
+        batcher = MicroBatcher(run_batch, max_batch_size=max_batch_size, max_wait_ms=5)
+        await batcher.start()
+        try:
+            return await scenario(batcher)
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(main()), sizes
+
+
+def test_concurrent_submissions_share_a_forward_pass():
+    a, b = torch.ones(1, 2), torch.full((2, 2), 3.0)
+
+    (out_a, out_b), sizes = run_with_batcher(lambda batcher: asyncio.gather(batcher.submit(a), batcher.submit(b)))
+
+    assert sizes == [3]
+    assert torch.equal(out_a[0], a * 2) and torch.equal(out_b[0], b * 2)
+
+
+def test_oversized_submission_is_split_and_reassembled_in_order():
+    x = torch.arange(22.0).view(11, 2)
+
+    (doubled, sums), sizes = run_with_batcher(lambda batcher: batcher.submit(x))
+
+    assert sizes == [4, 4, 3]
+    assert torch.equal(doubled, x * 2)
+    assert torch.equal(sums, x.sum(dim=1))
+
+
+def test_no_forward_pass_exceeds_max_batch_size():
+    x, y = torch.ones(3, 2), torch.ones(6, 2)
+
+    _, sizes = run_with_batcher(lambda batcher: asyncio.gather(batcher.submit(x), batcher.submit(y)))
+
+    assert max(sizes) <= 4 and sum(sizes) == 9
+
+
+def test_failure_reaches_every_submitter():
+    with pytest.raises(RuntimeError, match="model failed"):
+        run_with_batcher(lambda batcher: batcher.submit(torch.ones(6, 2)), fail=True)
@@ -0,0 +1,90 @@
+"""Uploads staged for a prediction are deleted again when it can't be saved."""
+import asyncio
+import importlib
+import io
+import os
+
+import pytest
+import torch
+from starlette.datastructures import UploadFile
+
+import models
+from conftest import BACKEND, add_user, stage, stored_files
+from scan_writer import PendingScan, ScanWriter
+
+
+def write(writer, *units):
+    async def run():
+        await writer.start()
+        for unit in units:
+            writer.submit_all(unit)
+        await writer.stop()
+    asyncio.run(run())
+
+
+def test_failed_scan_write_deletes_its_images_and_records_the_failure(db, session_factory, storage):
+    add_user(db)
+    db.add(models.Scan(scan_id=5, user_id=1))
+    db.commit()
+    writer = ScanWriter(session_factory, storage, max_delay_ms=200)
+
+    good = PendingScan(10, 1, None, 0.9, images=[stage(storage, b"good")])
+    taken = PendingScan(5, 1, None, 0.9, images=[stage(storage, b"bad")])   # scan_id already used
+    write(writer, [good], [taken])
+
+    assert writer.status(10) is None and writer.status(5) == "failed"
+    assert db.get(models.ScanWriteFailure, 5).user_id == 1
+    paths = [image.image_path for image in db.query(models.ScanImage)]
+    assert len(paths) == 1 and os.path.exists(paths[0])
+    assert len(stored_files(storage)) == 1   # only the written scan's image is left
+
+
+@pytest.fixture(scope="module")
+def main():
+    """The app module, on the test database and upload directory (see conftest.py), without loading the models."""
+    cwd = os.getcwd()
+    os.chdir(BACKEND)   # label metadata is read relative to the backend
+    try:
+        yield importlib.import_module("main")
+    finally:
+        os.chdir(cwd)
+
+
+def uploads(*contents):
+    return [UploadFile(io.BytesIO(data), filename=f"{i}.jpg") for i, data in enumerate(contents)]
+
+
+@pytest.fixture
+def decode_nothing(main, monkeypatch):
+    async def preprocess_image(source, out=None):
+        return out.fill_(0)
+    monkeypatch.setattr(main, "preprocess_image", preprocess_image)
+
+
+def test_predict_probs_discards_staged_uploads_when_inference_fails(main, decode_nothing, monkeypatch):
+    async def inference_down(batch):
+        raise RuntimeError("inference down")
+    monkeypatch.setattr(main.batcher, "submit", inference_down)
+
+    staged = []
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.predict_probs(uploads(b"a" * 10, b"b" * 10), staged=staged))
+
+    assert len(staged) == 2
+    assert stored_files(main.storage) == []
+
+
+def test_predict_probs_keeps_staged_uploads_for_the_scan_writer(main, decode_nothing, monkeypatch):
+    async def run(batch):
+        return torch.ones(len(batch), 3), torch.ones(len(batch), 2)
+    monkeypatch.setattr(main.batcher, "submit", run)
+
+    staged = []
+    species_probs, _ = asyncio.run(main.predict_probs(uploads(b"c" * 10, b"d" * 10), staged=staged))
+
+    try:
+        assert species_probs.shape == (2, 3)
+        assert all(os.path.exists(blob.temp_path) for blob in staged) and len(staged) == 2
+    finally:
+        for blob in staged:
+            asyncio.run(main.storage.discard(blob))
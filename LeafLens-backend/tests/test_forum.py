@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import forum
+import models
+from conftest import add_user
+
+
+def add_posts(db, count, same_timestamp_every=3):
+    """`count` posts, several sharing a timestamp so pages have to break ties on post_id."""
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        db.add(models.ForumPost(
+            user_id=1 + i % 2,
+            title=f"Tomato question {i}",
+            content=f"Leaves with blight spots, post {i}",
+            timestamp=start + timedelta(minutes=i // same_timestamp_every),
+        ))
+    db.commit()
+
+
+def all_pages(fetch, limit):
+    posts, cursor, pages = [], None, 0
+    while True:
+        page, cursor = fetch(limit=limit, cursor=cursor)
+        assert len(page) <= limit
+        posts += page
+        pages += 1
+        if cursor is None:
+            return posts, pages
+
+
+def test_list_posts_cursor_walks_every_post_once_newest_first(db):
+    add_user(db, 1)
+    add_user(db, 2)
+    add_posts(db, 23)
+
+    posts, pages = all_pages(lambda **kw: forum.list_posts(db, **kw), limit=5)
+
+    expected = db.query(models.ForumPost).order_by(
+        models.ForumPost.timestamp.desc(), models.ForumPost.post_id.desc()
+    ).all()
+    assert [p.post_id for p in posts] == [p.post_id for p in expected]
+    assert pages == 5
+
+
+def test_list_posts_last_full_page_has_no_cursor(db):
+    add_user(db, 1)
+    add_user(db, 2)
+    add_posts(db, 10)
+
+    _, cursor = forum.list_posts(db, limit=5)
+    page, cursor = forum.list_posts(db, limit=5, cursor=cursor)
+
+    assert len(page) == 5
+    assert cursor is None
+
+
+def test_list_posts_user_filter(db):
+    add_user(db, 1)
+    add_user(db, 2)
+    add_posts(db, 9)
+
+    posts, _ = all_pages(lambda **kw: forum.list_posts(db, user_id=2, **kw), limit=2)
+
+    assert len(posts) == 4
+    assert {p.user_id for p in posts} == {2}
+
+
+def test_search_posts_cursor_walks_every_match_once(db):
+    add_user(db, 1)
+    add_user(db, 2)
+    add_posts(db, 17)
+    db.add(models.ForumPost(user_id=1, title="Rose care", content="Pruning in spring"))
+    db.commit()
+
+    posts, _ = all_pages(lambda **kw: forum.search_posts(db, "blight", **kw), limit=4)
+
+    ids = [p.post_id for p in posts]
+    assert len(ids) == len(set(ids)) == 17
+    assert [p.rank for p in posts] == sorted(p.rank for p in posts)
+
+
+def add_titled_posts(db, *titles):
+    add_user(db, 1)
+    for title in titles:
+        db.add(models.ForumPost(user_id=1, title=title, content="see title"))
+    db.commit()
+
+
+def filtered_titles(db, **filters):
+    posts, _ = forum.list_posts(db, **filters)
+    return sorted(p.title for p in posts)
+
+
+def test_list_posts_plant_filter_matches_a_phrase_with_punctuation(db):
+    add_titled_posts(db, "Tomato Late blight again", "Blight came late this year", "Tomato___Leaf_Mold?")
+
+    assert filtered_titles(db, plant="late-blight") == ["Tomato Late blight again"]
+    assert filtered_titles(db, plant="Tomato___Leaf_Mold") == ["Tomato___Leaf_Mold?"]
+
+
+def test_list_posts_plant_filter_matches_a_word_prefix(db):
+    add_titled_posts(db, "Tomato Late blight again", "Potato scab")
+
+    assert filtered_titles(db, plant="tomat") == ["Tomato Late blight again"]
+
+
+def test_list_posts_filter_without_words_falls_back_to_ilike(db):
+    add_titled_posts(db, "C++ for plant sensors", "100% yellow leaves", "Tomato")
+
+    assert filtered_titles(db, plant="++") == ["C++ for plant sensors"]
+    assert filtered_titles(db, plant="%") == ["100% yellow leaves"]
@@ -0,0 +1,28 @@
+import models
+from id_allocator import IdAllocator
+
+
+def allocator(session_factory, block_size=5):
+    return IdAllocator(session_factory, "scans", models.Scan.scan_id, block_size=block_size)
+
+
+def test_ids_are_unique_across_allocators_sharing_a_database(session_factory):
+    first, second = allocator(session_factory), allocator(session_factory)
+
+    ids = first.next_ids(3) + second.next_ids(7) + first.next_ids(4) + [second.next_id()]
+
+    assert len(set(ids)) == len(ids) == 15
+
+
+def test_next_ids_spans_several_blocks_in_order(session_factory):
+    ids = allocator(session_factory, block_size=2).next_ids(5)
+
+    assert ids == sorted(ids) and len(set(ids)) == 5
+
+
+def test_reserved_covers_every_handed_out_id(session_factory):
+    ids_from = allocator(session_factory)
+    ids = ids_from.next_ids(3)
+
+    assert all(ids_from.reserved(i) for i in ids)
+    assert not allocator(session_factory).reserved(max(ids) + 100)
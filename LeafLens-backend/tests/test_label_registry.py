@@ -0,0 +1,48 @@
+import torch
+
+from label_registry import LabelRegistry
+
+
+def registry():
+    # species 0 can have diseases 0 and 1, species 1 has no mapped diseases
+    return LabelRegistry(
+        ["Rosa canina", "Unknown weed"], ["blight", "rust", "mildew"],
+        species_diseases={"rose": ["blight", "rust"]},
+        normalize=lambda name: "rose" if name.startswith("Rosa") else name,
+    )
+
+
+def test_filter_keeps_the_species_diseases_and_renormalizes():
+    probs, mask = registry().filter_diseases(torch.tensor([[0.2, 0.2, 0.6]]), torch.tensor([0]))
+
+    assert torch.allclose(probs, torch.tensor([[0.5, 0.5, 0.0]]))
+    assert mask.tolist() == [[True, True, False]]
+
+
+def test_species_without_mapped_diseases_is_left_unchanged():
+    disease_probs = torch.tensor([[0.2, 0.2, 0.6]])
+
+    probs, mask = registry().filter_diseases(disease_probs, torch.tensor([1]))
+
+    assert torch.equal(probs, disease_probs)
+    assert mask.tolist() == [[True, True, True]]
+
+
+def test_no_probability_left_after_filtering_is_left_unchanged():
+    disease_probs = torch.tensor([[0.0, 0.0, 1.0]])
+
+    probs, mask = registry().filter_diseases(disease_probs, torch.tensor([0]))
+
+    assert torch.equal(probs, disease_probs)
+    assert mask.tolist() == [[True, True, True]]
+
+
+def test_predict_returns_fewer_diseases_than_k_for_species_with_fewer():
+    species = torch.tensor([[0.9, 0.1]])
+    diseases = torch.tensor([[0.1, 0.3, 0.6]])
+
+    per_image, average = registry().predict(species, diseases, topk_species=1, topk_disease=3)
+
+    assert [d["disease"] for d in per_image[0].diseases] == ["rust", "blight"]
+    assert per_image[0].species[0]["species"] == "Rosa canina"
+    assert average.diseases == per_image[0].diseases
@@ -0,0 +1,147 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+import torch
+from sqlalchemy import update
+
+import models
+import scan_jobs
+from conftest import add_user, stage, stored_files
+from id_allocator import IdAllocator
+from label_registry import LabelRegistry
+
+Item = models.ScanJobItem
+
+
+async def preprocess(source, out):
+    return out.fill_(0)
+
+
+async def run_batch(batch):
+    return torch.ones(len(batch), 1), torch.full((len(batch), 2), 0.5)
+
+
+@pytest.fixture
+def runner(session_factory, storage):
+    labels = LabelRegistry(["species"], ["disease a", "disease b"], species_diseases={})
+    scan_ids = IdAllocator(session_factory, "scans", models.Scan.scan_id, block_size=10)
+    return scan_jobs.JobRunner(
+        session_factory, storage, preprocess, run_batch, labels, scan_ids,
+        batch_size=2, lease_seconds=60, max_attempts=2, input_size=4,
+    )
+
+
+@pytest.fixture
+def job(db, storage):
+    """A queued job of three stored images."""
+    add_user(db)
+    images = []
+    for i in range(3):
+        blob = stage(storage, bytes([i]) * 10)
+        images.append((f"{i}.jpg", asyncio.run(storage.commit(blob)), blob.digest))
+    return scan_jobs.create_job(db, 1, images)
+
+
+def expire_leases(db):
+    db.execute(update(Item).where(Item.status == "running").values(
+        claimed_at=datetime.utcnow() - timedelta(hours=1)
+    ))
+    db.commit()
+
+
+def statuses(db, job_id):
+    db.expire_all()
+    return [item.status for item in db.query(Item).filter(Item.job_id == job_id).order_by(Item.position)]
+
+
+def test_claims_lease_disjoint_batches(db, runner, job):
+    _, _, first = runner._claim()
+    _, _, second = runner._claim()
+
+    assert [item.position for item in first] == [0, 1]
+    assert [item.position for item in second] == [2]
+    assert runner._claim() is None
+    db.refresh(job)
+    assert job.status == "running"
+
+
+def test_expired_lease_is_claimed_again(db, runner, job):
+    runner._claim()
+    runner._claim()
+    expire_leases(db)
+
+    token, _, items = runner._claim()
+
+    assert [item.position for item in items] == [0, 1]
+    assert {item.attempts for item in items} == {2}
+    assert {item.worker for item in items} == {token}
+
+
+def test_processing_writes_scans_and_finishes_the_job(db, runner, job):
+    asyncio.run(runner._process(*runner._claim()))
+    asyncio.run(runner._process(*runner._claim()))
+
+    db.expire_all()
+    assert statuses(db, job.job_id) == ["done"] * 3
+    assert db.get(models.ScanJob, job.job_id).status == "done"
+    assert db.query(models.Scan).count() == 3
+    assert db.get(models.UserStats, 1).scans_count == 3
+
+
+def test_lease_that_ran_out_on_its_last_attempt_fails_and_deletes_its_blob(db, runner, storage, job):
+    for _ in range(2):
+        runner._claim()
+        runner._claim()
+        expire_leases(db)
+
+    released = runner._reap()
+    asyncio.run(runner._delete_unreferenced(released))
+
+    assert statuses(db, job.job_id) == ["failed"] * 3
+    db.expire_all()
+    assert db.get(models.ScanJob, job.job_id).status == "done"
+    assert stored_files(storage) == []
+
+
+def test_cancel_drops_pending_images_and_their_blobs(db, runner, storage, job):
+    runner._claim()
+
+    cancelled, dropped = scan_jobs.cancel_job(db, db.get(models.ScanJob, job.job_id))
+    asyncio.run(scan_jobs.delete_unreferenced(db, storage, dropped))
+
+    assert cancelled.status == "cancelled"
+    assert statuses(db, job.job_id) == ["running", "running", "cancelled"]
+    # the claimed images still finish, so only the dropped one's blob goes
+    assert len(stored_files(storage)) == 2
+
+
+def test_running_images_of_a_cancelled_job_are_not_claimed_again(db, runner, storage, job):
+    runner._claim()
+    scan_jobs.cancel_job(db, db.get(models.ScanJob, job.job_id))
+    expire_leases(db)
+
+    assert runner._claim() is None
+    asyncio.run(runner._delete_unreferenced(runner._reap()))
+
+    assert statuses(db, job.job_id) == ["cancelled"] * 3
+    assert len(stored_files(storage)) == 1   # the pending image's blob, left to cancel_job's caller
+
+
+def test_blob_shared_with_a_pending_image_is_kept(db, runner, storage, job):
+    other = scan_jobs.create_job(db, 1, [("again.jpg", job.items[2].image_path, job.items[2].content_hash)])
+
+    _, dropped = scan_jobs.cancel_job(db, db.get(models.ScanJob, job.job_id))
+    asyncio.run(scan_jobs.delete_unreferenced(db, storage, dropped))
+
+    assert statuses(db, other.job_id) == ["pending"]
+    assert os.path.exists(job.items[2].image_path)
+
+
+def test_cancel_twice_is_a_conflict(db, job):
+    scan_jobs.cancel_job(db, db.get(models.ScanJob, job.job_id))
+
+    with pytest.raises(scan_jobs.HTTPException) as error:
+        scan_jobs.cancel_job(db, db.get(models.ScanJob, job.job_id))
+    assert error.value.status_code == 409
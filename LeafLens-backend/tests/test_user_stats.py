@@ -0,0 +1,75 @@
+import models
+import user_stats
+from conftest import add_user
+
+
+def counters(db, user_id):
+    row = db.get(models.UserStats, user_id)
+    db.refresh(row)
+    return {name: getattr(row, name) for name in user_stats.COUNTERS}
+
+
+def test_bump_adds_to_an_existing_row(db):
+    add_user(db)
+    db.add(models.UserStats(user_id=1, posts_count=2, total_likes_received=5, scans_count=1))
+    db.commit()
+
+    user_stats.bump(db, 1, posts_count=1, scans_count=3)
+    db.commit()
+
+    assert counters(db, 1) == {"posts_count": 3, "total_likes_received": 5, "scans_count": 4}
+
+
+def test_bump_without_a_row_rebuilds_it_including_the_change(db):
+    add_user(db)
+    db.add(models.Scan(scan_id=1, user_id=1))
+    db.commit()
+
+    # the endpoint adds its row, then bumps in the same transaction
+    db.add(models.ForumPost(user_id=1, title="t", content="c"))
+    user_stats.bump(db, 1, posts_count=1)
+    db.commit()
+
+    assert counters(db, 1) == {"posts_count": 1, "total_likes_received": 0, "scans_count": 1}
+
+
+def test_bump_rolls_back_with_the_change(db):
+    add_user(db)
+    db.add(models.UserStats(user_id=1, posts_count=0, total_likes_received=0, scans_count=0))
+    db.commit()
+
+    db.add(models.ForumPost(user_id=1, title="t", content="c"))
+    user_stats.bump(db, 1, posts_count=1)
+    db.rollback()
+
+    assert counters(db, 1)["posts_count"] == 0
+
+
+def test_bump_ignores_anonymous_users_and_zero_deltas(db):
+    add_user(db)
+    user_stats.bump(db, None, posts_count=1)
+    user_stats.bump(db, 1, posts_count=0)
+    db.commit()
+
+    assert db.get(models.UserStats, 1) is None
+
+
+def test_rebuild_reports_and_repairs_drift(db):
+    add_user(db, 1)
+    add_user(db, 2)
+    post = models.ForumPost(user_id=1, title="t", content="c")
+    db.add(post)
+    db.flush()
+    db.add(models.PostLike(post_id=post.post_id, user_id=2))
+    db.add(models.UserStats(user_id=1, posts_count=7, total_likes_received=1, scans_count=0))
+    db.commit()
+
+    assert user_stats.rebuild(db, check=True) == {1: {"posts_count": (7, 1)}}
+    assert db.get(models.UserStats, 2) is None
+
+    user_stats.rebuild(db)
+    db.commit()
+
+    assert counters(db, 1) == {"posts_count": 1, "total_likes_received": 1, "scans_count": 0}
+    assert counters(db, 2) == {"posts_count": 0, "total_likes_received": 0, "scans_count": 0}
+    assert user_stats.rebuild(db, check=True) == {}
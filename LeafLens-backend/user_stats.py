@@ -0,0 +1,129 @@
+"""
+Materialized per-user counters behind GET /users/{user_id}/stats.
+
+Every endpoint that creates or deletes posts, likes or scans calls bump() in
+the same transaction as its change, after making it, so the counters commit or
+roll back with it. rebuild() recomputes them from the source tables, to
+backfill or to repair drift after writes that bypassed the API:
+
+    python user_stats.py rebuild [--check] [--user-id 42]
+"""
+import argparse
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import models
+
+COUNTERS = ("posts_count", "total_likes_received", "scans_count")
+
+
+def bump(db, user_id, **deltas):
+    """
+    Add `deltas` (counter name -> change) to a user's counters. Call it once
+    the change is in the session: a user without a row yet gets one rebuilt
+    from the source tables, flushed first so they already include the change.
+    """
+    if user_id is None or not any(deltas.values()):
+        return
+    updated = db.execute(
+        update(models.UserStats).where(models.UserStats.user_id == user_id)
+        .values({name: getattr(models.UserStats, name) + delta for name, delta in deltas.items() if delta})
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if updated:
+        return
+
+    db.flush()
+    counts = actual_counts(db, [user_id]).get(user_id)
+    if counts is None:
+        return
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(models.UserStats).values(user_id=user_id, **counts)
+    # another transaction created the row meanwhile, from counts without this change
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.UserStats.user_id],
+        set_={name: getattr(models.UserStats, name) + deltas.get(name, 0) for name in COUNTERS},
+    ))
+
+
+def actual_counts(db, user_ids=None):
+    """Counters computed from the source tables, for every user or just `user_ids`."""
+    def grouped(query, user_column):
+        if user_ids is not None:
+            query = query.filter(user_column.in_(user_ids))
+        return dict(query.group_by(user_column).all())
+
+    posts = grouped(
+        db.query(models.ForumPost.user_id, func.count(models.ForumPost.post_id)), models.ForumPost.user_id
+    )
+    likes = grouped(
+        db.query(models.ForumPost.user_id, func.count(models.PostLike.like_id)).join(
+            models.PostLike, models.PostLike.post_id == models.ForumPost.post_id
+        ),
+        models.ForumPost.user_id,
+    )
+    scans = grouped(db.query(models.Scan.user_id, func.count(models.Scan.scan_id)), models.Scan.user_id)
+
+    users = db.query(models.User.user_id)
+    if user_ids is not None:
+        users = users.filter(models.User.user_id.in_(user_ids))
+    return {
+        user_id: {
+            "posts_count": posts.get(user_id, 0),
+            "total_likes_received": likes.get(user_id, 0),
+            "scans_count": scans.get(user_id, 0),
+        }
+        for (user_id,) in users
+    }
+
+
+def rebuild(db, user_ids=None, check=False):
+    """
+    Reconcile the stored counters with the source tables and return the
+    users whose counters were wrong, as {user_id: {counter: (stored, actual)}}.
+    With `check` the differences are only reported. The caller commits.
+    """
+    stored = db.query(models.UserStats)
+    if user_ids is not None:
+        stored = stored.filter(models.UserStats.user_id.in_(user_ids))
+    stored = {row.user_id: row for row in stored}
+
+    drift = {}
+    for user_id, counts in actual_counts(db, user_ids).items():
+        row = stored.get(user_id)
+        current = {name: getattr(row, name) if row else 0 for name in COUNTERS}
+        diff = {name: (current[name], counts[name]) for name in COUNTERS if current[name] != counts[name]}
+        if diff or row is None:
+            if diff:
+                drift[user_id] = diff
+            if not check:
+                db.merge(models.UserStats(user_id=user_id, **counts))
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the materialized user_stats counters")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--check", action="store_true", help="only report users whose counters are wrong")
+    parser.add_argument("--user-id", type=int, action="append", help="limit to these users")
+    args = parser.parse_args()
+
+    import migrate
+    from database import SessionLocal, engine
+    migrate.upgrade(engine)
+
+    db = SessionLocal()
+    try:
+        drift = rebuild(db, args.user_id, check=args.check)
+        db.commit()
+    finally:
+        db.close()
+
+    for user_id, diff in sorted(drift.items()):
+        print(user_id, ", ".join(f"{name} {stored} -> {actual}" for name, (stored, actual) in diff.items()))
+    print(f"{len(drift)} users {'out of sync' if args.check else 'repaired'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -63,7 +63,7 @@ const apiCall = async (endpoint: string, options: RequestInit = {}) => {
     console.log(`🟢 Success response:`, responseData);
 
     // FIX: Return the expected format with data property
-    return { data: responseData };
+    return { data: responseData, headers: response.headers };
   } catch (error) {
     console.error(`🔴 API call failed: ${endpoint}`, error);
     throw error;
@@ -452,16 +452,25 @@ export const diseasesAPI = {
 
 // Forum API - FIXED version
 export const forumAPI = {
-  // Get all forum posts
-  getForumPosts: async (plant?: string, disease?: string) => {
-    const params = new URLSearchParams();
+  // Get all forum posts, following the pages of the listing (newest first)
+  // One page of posts, newest first. Pass the returned nextCursor back as
+  // `cursor` for the next page; it is null on the last one.
+  getForumPosts: async (
+    plant?: string,
+    disease?: string,
+    options: { limit?: number; cursor?: string | null; userId?: string | number } = {}
+  ) => {
+    const params = new URLSearchParams({ limit: String(options.limit ?? 20) });
     if (plant) params.append("plant", plant);
     if (disease) params.append("disease", disease);
+    if (options.userId) params.append("user_id", String(options.userId));
+    if (options.cursor) params.append("cursor", options.cursor);
 
-    const queryString = params.toString();
-    const url = queryString ? `/forum_posts/?${queryString}` : `/forum_posts/`;
-
-    return apiCall(url);
+    const response = await apiCall(`/forum_posts/?${params.toString()}`);
+    return {
+      data: response.data || [],
+      nextCursor: response.headers.get("X-Next-Cursor") as string | null,
+    };
   },
 
   // Create new forum post
@@ -59,6 +59,8 @@ const ForumScreen = () => {
   const [userData, setUserData] = useState<any>(null);
   const [loading, setLoading] = useState(true);
   const [forumPosts, setForumPosts] = useState<Post[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedPost, setSelectedPost] = useState<Post | null>(null);
   const [replies, setReplies] = useState<Reply[]>([]);
   const [loadingReplies, setLoadingReplies] = useState(false);
@@ -120,10 +122,13 @@ const ForumScreen = () => {
   };
 
   // In your ForumScreen component - FIXED loadForumPosts function
-  const loadForumPosts = async () => {
+  // Loads the first page, or appends the page after `cursor`
+  const loadForumPosts = async (cursor: string | null = null) => {
     try {
       console.log("🔄 Loading forum posts...");
-      const response = await forumAPI.getForumPosts();
+      const response = await forumAPI.getForumPosts(undefined, undefined, {
+        cursor,
+      });
 
       // FIX: response.data should now contain the array of posts
       const backendPosts = response.data || [];
@@ -167,16 +172,31 @@ const ForumScreen = () => {
         })
       );
 
-      setForumPosts(transformedPosts);
+      setForumPosts((prevPosts) =>
+        cursor ? [...prevPosts, ...transformedPosts] : transformedPosts
+      );
+      setNextCursor(response.nextCursor);
     } catch (error) {
       console.error("❌ Error loading forum posts:", error);
       Alert.alert("Error", "Failed to load forum posts");
-      setForumPosts([]);
+      if (!cursor) setForumPosts([]);
     } finally {
       setLoading(false);
     }
   };
 
+  // Fetch the next page when the list is scrolled near its end
+  const loadMorePosts = async () => {
+    if (!nextCursor || loadingMore) return;
+
+    setLoadingMore(true);
+    try {
+      await loadForumPosts(nextCursor);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Handle liking a post - FIXED VERSION
   const handleLike = async (postId: number) => {
     if (!userData) {
@@ -739,6 +759,13 @@ const ForumScreen = () => {
         renderItem={renderPostItem}
         contentContainerStyle={styles.postsList}
         showsVerticalScrollIndicator={false}
+        onEndReached={loadMorePosts}
+        onEndReachedThreshold={0.5}
+        ListFooterComponent={
+          loadingMore ? (
+            <ActivityIndicator size="small" color="#3f704d" />
+          ) : null
+        }
         refreshControl={
           <RefreshControl
             refreshing={refreshing}
@@ -100,12 +100,12 @@ const Home = () => {
   // Load recent community posts
   const loadRecentPosts = async () => {
     try {
-      const response = await forumAPI.getForumPosts();
+      const response = await forumAPI.getForumPosts(undefined, undefined, { limit: 5 });
       const backendPosts = response.data || [];
       
       console.log('Loaded recent posts:', backendPosts.length);
       
-      const transformedPosts = backendPosts.slice(0, 5).map((post: any) => {
+      const transformedPosts = backendPosts.map((post: any) => {
         const likeCount = post.like_count !== undefined ? post.like_count : 0;
         
         return {
@@ -136,12 +136,11 @@ const Home = () => {
     }
 
     try {
-      const response = await forumAPI.getForumPosts();
-      const allPosts = response.data || [];
-      
-      const userPosts = allPosts.filter((post: any) => 
-        post.user_id?.toString() === userData.uid
-      ).slice(0, 5);
+      const response = await forumAPI.getForumPosts(undefined, undefined, {
+        limit: 5,
+        userId: userData.uid,
+      });
+      const userPosts = response.data || [];
       
       const transformedPosts = userPosts.map((post: any) => {
         const likeCount = post.like_count !== undefined ? post.like_count : 0;
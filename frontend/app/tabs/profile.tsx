@@ -13,7 +13,7 @@ import {
   View,
 } from "react-native";
 import { SafeAreaView } from "react-native-safe-area-context";
-import { forumAPI, scansAPI } from "../../app/api";
+import { forumAPI } from "../../app/api";
 import { styles } from "../styles/profilestyle";
 
 // Key for storing plant photos in AsyncStorage (should match your plants page)
@@ -239,64 +239,20 @@ const ProfileScreen = () => {
     }
   };
 
-  // Load posts count from backend
-  const loadPostsCount = async (userId: string) => {
+  // Load post, like and scan counters from backend
+  const loadBackendStats = async (userId: string) => {
     try {
-      const response = await forumAPI.getForumPosts();
-      const posts = response.data || response || [];
-      
-      // Convert userId to number for comparison
-      const userIdNum = parseInt(userId);
-      
-      // Count posts by this user
-      const userPosts = posts.filter((post: any) => 
-        post.user_id === userIdNum
-      );
-      
-      console.log(`📝 Posts count: ${userPosts.length}`);
-      return userPosts.length;
-    } catch (error) {
-      console.error("Error loading posts count:", error);
-      return 0;
-    }
-  };
-
-  // Load scans count from backend
-  const loadScansCount = async (userId: string) => {
-    try {
-      const response = await scansAPI.getScans(userId);
-      const scans = response.data || response || [];
-      console.log(`📸 Scans count: ${scans.length}`);
-      return scans.length;
-    } catch (error) {
-      console.error("Error loading scans count:", error);
-      return 0;
-    }
-  };
-
-  // Load likes count by calculating from user's posts
-  const loadLikesCount = async (userId: string) => {
-    try {
-      const response = await forumAPI.getForumPosts();
-      const posts = response.data || response || [];
-      
-      // Convert userId to number for comparison
-      const userIdNum = parseInt(userId);
-      
-      // Get posts by this user and sum their likes
-      const userPosts = posts.filter((post: any) => 
-        post.user_id === userIdNum
-      );
-      
-      const totalLikes = userPosts.reduce((sum: number, post: any) => {
-        return sum + (post.like_count || 0);
-      }, 0);
-      
-      console.log(`❤️ Likes count: ${totalLikes}`);
-      return totalLikes;
+      const response = await forumAPI.getUserStats(parseInt(userId));
+      const stats = response.data || {};
+      console.log("📝 Backend stats:", stats);
+      return {
+        postsCount: stats.posts_count || 0,
+        likesCount: stats.total_likes_received || 0,
+        scansCount: stats.scans_count || 0,
+      };
     } catch (error) {
-      console.error("Error loading likes count:", error);
-      return 0;
+      console.error("Error loading backend stats:", error);
+      return { postsCount: 0, likesCount: 0, scansCount: 0 };
     }
   };
 
@@ -309,17 +265,11 @@ const ProfileScreen = () => {
       const plantsCount = await loadPlantsCountFromStorage();
       
       // Load other stats from backend
-      const [postsCount, scansCount, likesCount] = await Promise.allSettled([
-        loadPostsCount(userId),
-        loadScansCount(userId),
-        loadLikesCount(userId)
-      ]);
+      const backendStats = await loadBackendStats(userId);
 
       const stats = {
         plantsCount: plantsCount,
-        postsCount: postsCount.status === 'fulfilled' ? postsCount.value : 0,
-        scansCount: scansCount.status === 'fulfilled' ? scansCount.value : 0,
-        likesCount: likesCount.status === 'fulfilled' ? likesCount.value : 0
+        ...backendStats,
       };
 
       console.log("✅ User stats loaded:", stats);